@@ -17,7 +17,10 @@ if os.name != "nt":
 
 bot = hikari.GatewayBot(
     token=os.environ["TOKEN"],
-    intents=hikari.Intents.GUILD_MESSAGES,
+    intents=hikari.Intents.GUILDS | hikari.Intents.GUILD_MESSAGES,
+    # Raise instead of silently waiting on long route buckets so slowmode
+    # edits can be deferred by the edit budget.
+    max_rate_limit=float(os.environ.get("MAX_RATE_LIMIT", 5)),
     # logs="TRACE_HIKARI",
 )
 
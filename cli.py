@@ -0,0 +1,424 @@
+import argparse
+import asyncio
+import gzip
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import aiosqlite
+
+from extensions.authors import HyperLogLog
+from extensions.db import Database
+from extensions.forecast import HoltForecaster
+from extensions.utils import EXPORT_FORMATS, export_activity
+
+
+async def open_read_only(path: str) -> Database:
+    """Open the bot's database for reading; never creates or migrates tables."""
+    database = Database(path)
+    try:
+        await database.init_read_only()
+    except (RuntimeError, aiosqlite.Error) as e:
+        sys.exit(f"Cannot open {path}: {e}")
+    return database
+
+
+async def run_export(args: argparse.Namespace) -> None:
+    database = await open_read_only(args.database)
+
+    since = int(time.time()) - args.window if args.window else 0
+
+    try:
+        if args.output == "-":
+            rows = await export_activity(
+                database,
+                sys.stdout,
+                args.format,
+                channel_id=args.channel,
+                guild_id=args.guild,
+                since=since,
+            )
+        else:
+            opener = gzip.open if args.output.endswith(".gz") else open
+            with opener(args.output, "wt", encoding="utf-8", newline="") as stream:
+                rows = await export_activity(
+                    database,
+                    stream,
+                    args.format,
+                    channel_id=args.channel,
+                    guild_id=args.guild,
+                    since=since,
+                )
+    finally:
+        await database.close()
+
+    print(f"Exported {rows} activity rows", file=sys.stderr)
+
+
+class ForecastScore:
+    """Forecast and naive last-minute errors for one channel."""
+
+    def __init__(self, horizon: int):
+        self.horizon = horizon
+        self.samples = 0
+        self.forecast_abs = self.forecast_sq = 0.0
+        self.naive_abs = self.naive_sq = 0.0
+
+    def add(self, actual: float, forecast: float, naive: float) -> None:
+        self.samples += 1
+        self.forecast_abs += abs(actual - forecast)
+        self.forecast_sq += (actual - forecast) ** 2
+        self.naive_abs += abs(actual - naive)
+        self.naive_sq += (actual - naive) ** 2
+
+    def row(self, label: str) -> str:
+        n = max(self.samples, 1)
+        return (
+            f"{label:<20} {self.samples:>8} "
+            f"{self.forecast_abs / n:>9.2f} {math.sqrt(self.forecast_sq / n):>9.2f} "
+            f"{self.naive_abs / n:>9.2f} {math.sqrt(self.naive_sq / n):>9.2f}"
+        )
+
+
+def score_channel(
+    counts: dict, horizon: int, alpha: float, beta: float
+) -> ForecastScore:
+    """Replay per-minute counts, scoring the forecast made `horizon` minutes earlier."""
+    forecaster = HoltForecaster(bucket_seconds=60, alpha=alpha, beta=beta)
+    score = ForecastScore(horizon)
+    pending = {}
+
+    first, last = min(counts), max(counts)
+    for minute in range(first, last + 60, 60):
+        actual = counts.get(minute, 0)
+
+        made = pending.pop(minute, None)
+        if made is not None:
+            score.add(actual, *made)
+
+        forecaster.add(minute, actual)
+        # Fold this minute now so the forecast includes it.
+        forecaster.advance(minute + 60)
+        pending[minute + horizon * 60] = (forecaster.forecast(horizon), actual)
+
+    return score
+
+
+async def run_forecast(args: argparse.Namespace) -> None:
+    database = await open_read_only(args.database)
+
+    since = int(time.time()) - args.window if args.window else 0
+    total = ForecastScore(args.horizon)
+
+    print(
+        f"{'channel':<20} {'samples':>8} {'mae':>9} {'rmse':>9} "
+        f"{'naive_mae':>9} {'naive_rmse':>9}"
+    )
+
+    def report(channel_id: int, counts: dict) -> None:
+        score = score_channel(counts, args.horizon, args.alpha, args.beta)
+        print(score.row(str(channel_id)))
+
+        total.samples += score.samples
+        total.forecast_abs += score.forecast_abs
+        total.forecast_sq += score.forecast_sq
+        total.naive_abs += score.naive_abs
+        total.naive_sq += score.naive_sq
+
+    try:
+        current = None
+        counts: dict = {}
+        # Rows arrive ordered by channel, so only one channel is held at a time.
+        async for channel_id, timestamp, count in database.iter_activity(
+            channel_id=args.channel, guild_id=args.guild, since=since
+        ):
+            if channel_id != current:
+                if counts:
+                    report(current, counts)
+                current, counts = channel_id, {}
+            counts[timestamp] = counts.get(timestamp, 0) + count
+
+        if counts:
+            report(current, counts)
+    finally:
+        await database.close()
+
+    print(total.row("total"))
+
+
+LEGACY_SCHEMA = """
+CREATE TABLE channel_config (
+    channel_id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    is_enabled INTEGER DEFAULT 1,
+    threshold INTEGER DEFAULT NULL
+);
+CREATE TABLE message_activity (
+    channel_id INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    message_count INTEGER DEFAULT 1,
+    author_sketch BLOB DEFAULT NULL,
+    PRIMARY KEY (channel_id, timestamp),
+    FOREIGN KEY (channel_id) REFERENCES channel_config(channel_id)
+);
+"""
+
+
+def timed(label: str, elapsed: float, repeat: int = 1) -> str:
+    return f"  {label:<34} {elapsed / repeat * 1000:>10.3f} ms"
+
+
+async def bench_legacy(path: str, channel_ids: list, args: argparse.Namespace) -> None:
+    """Time the per-minute row queries the bot used before activity_hours."""
+    async with aiosqlite.connect(path) as connection:
+        placeholders = ", ".join("?" for _ in channel_ids)
+        start_time = int(time.time()) - 900
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            async with connection.execute(
+                f"""
+                SELECT channel_id, SUM(message_count) FROM message_activity
+                WHERE channel_id IN ({placeholders}) AND timestamp >= ?
+                GROUP BY channel_id
+                """,
+                (*channel_ids, start_time),
+            ) as cursor:
+                await cursor.fetchall()
+        print(
+            timed("15m sum, all channels", time.perf_counter() - started, args.repeat)
+        )
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            async with connection.execute(
+                """
+                SELECT SUM(message_count) FROM message_activity
+                WHERE channel_id = ? AND timestamp >= ?
+                """,
+                (channel_ids[0], int(time.time()) - 86400),
+            ) as cursor:
+                await cursor.fetchone()
+        print(timed("24h sum, one channel", time.perf_counter() - started, args.repeat))
+
+        now = int(time.time())
+        started = time.perf_counter()
+        for index in range(args.messages):
+            await connection.execute(
+                """
+                INSERT INTO message_activity (channel_id, timestamp, message_count)
+                VALUES (?, ?, 1)
+                ON CONFLICT (channel_id, timestamp) DO UPDATE SET
+                message_count = message_count + excluded.message_count
+                """,
+                (channel_ids[index % len(channel_ids)], now - now % 60),
+            )
+            await connection.commit()
+        print(
+            timed(
+                f"record {args.messages} messages (total)",
+                time.perf_counter() - started,
+            )
+        )
+
+
+async def read_legacy(path: str) -> tuple:
+    """Per-minute counts and author sketches as stored before the migration."""
+    async with aiosqlite.connect(path) as connection:
+        async with connection.execute(
+            "SELECT channel_id, timestamp, message_count, author_sketch FROM message_activity"
+        ) as cursor:
+            rows = await cursor.fetchall()
+
+    counts = {(row[0], row[1]): row[2] for row in rows}
+    sketches = {(row[0], row[1]): row[3] for row in rows if row[3] is not None}
+    return counts, sketches
+
+
+async def verify_migration(database: Database, counts: dict, sketches: dict) -> None:
+    """Exit if migrated activity differs from the legacy rows in any minute."""
+    migrated = {
+        (channel_id, timestamp): count
+        async for channel_id, timestamp, count in database.iter_activity()
+    }
+    async with database.connection.execute(
+        "SELECT channel_id, minute, sketch FROM author_sketches"
+    ) as cursor:
+        migrated_sketches = {
+            (row[0], row[1]): row[2] for row in await cursor.fetchall()
+        }
+
+    if migrated != counts:
+        sys.exit(
+            f"Migration changed message counts: {sum(counts.values())} -> "
+            f"{sum(migrated.values())} messages"
+        )
+    if migrated_sketches != sketches:
+        sys.exit(
+            f"Migration changed author sketches: {len(sketches)} -> "
+            f"{len(migrated_sketches)} sketches"
+        )
+    print(
+        f"  {'migration verified':<34} {sum(counts.values()):>10} messages, "
+        f"{len(sketches)} sketches"
+    )
+
+
+async def bench_hours(
+    path: str, channel_ids: list, args: argparse.Namespace, legacy: tuple
+) -> None:
+    database = Database(path)
+
+    started = time.perf_counter()
+    await database.init()
+    print(timed("migrate and vacuum", time.perf_counter() - started))
+    print(f"  {'file size':<34} {os.path.getsize(path) / 1024:>10.0f} KiB")
+
+    try:
+        await verify_migration(database, *legacy)
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            await database.get_channels_activity(channel_ids, 900)
+        print(
+            timed("15m sum, all channels", time.perf_counter() - started, args.repeat)
+        )
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            await database.get_channel_activity(channel_ids[0], 86400)
+        print(timed("24h sum, one channel", time.perf_counter() - started, args.repeat))
+
+        now = int(time.time())
+        started = time.perf_counter()
+        for index in range(args.messages):
+            database.record_message(channel_ids[index % len(channel_ids)], now)
+        await database.flush_activity()
+        print(
+            timed(
+                f"record {args.messages} messages (total)",
+                time.perf_counter() - started,
+            )
+        )
+    finally:
+        await database.close()
+
+
+async def run_bench(args: argparse.Namespace) -> None:
+    """Compare the legacy per-minute table against packed channel-hour rows."""
+    rng = random.Random(args.seed)
+    channel_ids = list(range(1, args.channels + 1))
+    now = int(time.time())
+    first_minute = now - now % 60 - args.hours * 3600
+
+    sketches = []
+    for _ in range(16):
+        sketch = HyperLogLog()
+        for _ in range(rng.randint(1, 30)):
+            sketch.add(rng.getrandbits(63))
+        sketches.append(sketch.to_bytes())
+
+    with tempfile.TemporaryDirectory() as directory:
+        legacy_path = os.path.join(directory, "legacy.db")
+
+        async with aiosqlite.connect(legacy_path) as connection:
+            await connection.executescript(LEGACY_SCHEMA)
+            await connection.executemany(
+                "INSERT INTO channel_config (channel_id, guild_id) VALUES (?, 1)",
+                [(channel_id,) for channel_id in channel_ids],
+            )
+            for channel_id in channel_ids:
+                await connection.executemany(
+                    "INSERT INTO message_activity VALUES (?, ?, ?, ?)",
+                    [
+                        (
+                            channel_id,
+                            first_minute + minute * 60,
+                            rng.randint(1, 20),
+                            rng.choice(sketches) if rng.random() < 0.5 else None,
+                        )
+                        for minute in range(args.hours * 60)
+                        if rng.random() < args.fill
+                    ],
+                )
+            await connection.commit()
+
+        hours_path = os.path.join(directory, "hours.db")
+        shutil.copyfile(legacy_path, hours_path)
+        legacy = await read_legacy(legacy_path)
+
+        print(
+            f"{args.channels} channels, {args.hours}h of activity, "
+            f"{args.fill:.0%} of minutes active"
+        )
+        print("message_activity (one row per channel-minute):")
+        print(f"  {'file size':<34} {os.path.getsize(legacy_path) / 1024:>10.0f} KiB")
+        await bench_legacy(legacy_path, channel_ids, args)
+
+        print("activity_hours (one packed row per channel-hour):")
+        await bench_hours(hours_path, channel_ids, args, legacy)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Auto-slowmode maintenance tools")
+    parser.add_argument(
+        "--database",
+        default=os.environ.get("DATABASE_PATH", "data/auto_slowmode.db"),
+        help="Path to the SQLite database",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export = subparsers.add_parser("export", help="Dump recorded message activity")
+    export.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    export.add_argument("--channel", type=int, help="Only export this channel")
+    export.add_argument("--guild", type=int, help="Only export this server")
+    export.add_argument(
+        "--window", type=int, help="Only export the last WINDOW seconds"
+    )
+    export.add_argument(
+        "--output",
+        default="-",
+        help="Output file, gzip-compressed if it ends in .gz (default: stdout)",
+    )
+    export.set_defaults(handler=run_export)
+
+    forecast = subparsers.add_parser(
+        "forecast", help="Evaluate the rate forecaster against recorded activity"
+    )
+    forecast.add_argument("--channel", type=int, help="Only evaluate this channel")
+    forecast.add_argument("--guild", type=int, help="Only evaluate this server")
+    forecast.add_argument("--window", type=int, help="Only use the last WINDOW seconds")
+    forecast.add_argument(
+        "--horizon", type=int, default=1, help="Minutes ahead to forecast (default: 1)"
+    )
+    forecast.add_argument("--alpha", type=float, default=0.5, help="Level smoothing")
+    forecast.add_argument("--beta", type=float, default=0.1, help="Trend smoothing")
+    forecast.set_defaults(handler=run_forecast)
+
+    bench = subparsers.add_parser(
+        "bench", help="Benchmark activity storage on a synthetic database"
+    )
+    bench.add_argument("--channels", type=int, default=200)
+    bench.add_argument("--hours", type=int, default=24)
+    bench.add_argument(
+        "--fill", type=float, default=0.5, help="Fraction of minutes with messages"
+    )
+    bench.add_argument("--messages", type=int, default=2000)
+    bench.add_argument("--repeat", type=int, default=20)
+    bench.add_argument("--seed", type=int, default=0)
+    bench.set_defaults(handler=run_bench)
+
+    args = parser.parse_args()
+
+    if args.command != "bench" and not os.path.exists(args.database):
+        parser.error(f"Database file not found: {args.database}")
+
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,26 @@
-import datetime
+import gzip
 import logging
+import os
+import tempfile
 
 import arc
 import hikari
 import toolbox
 
+from .authors import AuthorTracker
+from .bursts import BurstDetector
 from .db import Database
-from .utils import calculate_message_rate
+from .forecast import ForecastTracker
+from .ingest import EventClock
+from .loadshed import LoadMonitor
+from .profiling import TickProfiler
+from .ratelimit import EditBudget, reset_slowmode
+from .utils import (
+    EXPORT_FORMATS,
+    calculate_message_rate,
+    export_activity,
+    get_slowmode_seconds,
+)
 
 logger = logging.getLogger("admin")
 
@@ -68,6 +82,7 @@ async def channel_disable(
         arc.ChannelParams("The channel to disable auto-slowmode for"),
     ] = None,
     database: Database = arc.inject(),
+    edit_budget: EditBudget = arc.inject(),
 ) -> None:
     if not channel:
         channel_in = ctx.channel
@@ -81,12 +96,21 @@ async def channel_disable(
     await database.get_channel_config(channel_in.id, ctx.guild_id)
 
     await database.update_channel_config(channel_in.id, is_enabled=0)
+    # Drop any queued edit so the flush loop doesn't re-apply it.
+    edit_budget.discard(channel_in.id)
+
+    retry_after = await reset_slowmode(ctx.client.app.rest, database, channel_in.id)
 
-    await ctx.client.app.rest.edit_channel(channel_in.id, rate_limit_per_user=0)
+    description = "Auto-slowmode has been disabled for this channel."
+    if retry_after is not None:
+        description += (
+            f" Discord is rate limiting edits to it, so its slowmode will be reset "
+            f"in about {retry_after:.0f} seconds."
+        )
 
     embed = hikari.Embed(
         title="Auto Slowmode Disabled",
-        description="Auto-slowmode has been disabled for this channel.",
+        description=description,
         color=0xFF0000,
     )
 
@@ -137,6 +161,57 @@ async def channel_threshold(
     )
 
 
+@channel_group.include
+@arc.slash_subcommand(
+    "min-authors",
+    "Set how many distinct authors must be active before slowmode applies",
+)
+async def channel_min_authors(
+    ctx: arc.GatewayContext,
+    min_authors: arc.Option[
+        int,
+        arc.IntParams(
+            "Distinct authors in the last minute (0 to use the server default)",
+            name="authors",
+            min=0,
+            max=1000,
+        ),
+    ],
+    channel: arc.Option[
+        hikari.TextableGuildChannel | None,
+        arc.ChannelParams("The channel to set the minimum for"),
+    ] = None,
+    database: Database = arc.inject(),
+) -> None:
+    if not channel:
+        channel_in = ctx.channel
+    else:
+        channel_in = channel
+
+    if not ctx.guild_id:
+        await ctx.respond("This command can only be used in a server.")
+        return
+
+    await database.get_channel_config(channel_in.id, ctx.guild_id)
+
+    await database.update_channel_config(channel_in.id, min_authors=min_authors or None)
+
+    embed = hikari.Embed(
+        title="Auto Slowmode Minimum Authors Set",
+        description=(
+            f"Auto-slowmode for {channel_in.mention} will only apply when at least {min_authors} distinct authors are active"
+            if min_authors
+            else f"Auto-slowmode for {channel_in.mention} will use the server's minimum author count"
+        ),
+        color=0x00FF00,
+    )
+
+    await ctx.respond(embed=embed)
+    logger.info(
+        f"Auto-slowmode minimum authors set to {min_authors} for channel {channel_in.id} by user {ctx.author.id}"
+    )
+
+
 server_group = auto_slowmode.include_subgroup(
     "server", "Configure auto-slowmode server-wide settings"
 )
@@ -185,7 +260,9 @@ async def server_enable(
 @server_group.include
 @arc.slash_subcommand("disable", "Disable auto-slowmode server-wide")
 async def server_disable(
-    ctx: arc.GatewayContext, database: Database = arc.inject()
+    ctx: arc.GatewayContext,
+    database: Database = arc.inject(),
+    edit_budget: EditBudget = arc.inject(),
 ) -> None:
     guild_id = ctx.guild_id
 
@@ -202,6 +279,7 @@ async def server_disable(
         if text_channel:
             await database.get_channel_config(text_channel.id, guild_id)
             await database.update_channel_config(text_channel.id, is_enabled=0)
+            edit_budget.discard(text_channel.id)
 
     await ctx.respond("Auto-slowmode has been disabled server-wide")
     logger.info(
@@ -240,6 +318,87 @@ async def server_threshold(
     )
 
 
+@server_group.include
+@arc.slash_subcommand(
+    "min-authors",
+    "Set the default number of distinct authors needed before slowmode applies",
+)
+async def server_min_authors(
+    ctx: arc.GatewayContext,
+    min_authors: arc.Option[
+        int,
+        arc.IntParams(
+            "Distinct authors in the last minute (0 to disable)",
+            name="authors",
+            min=0,
+            max=1000,
+        ),
+    ],
+    database: Database = arc.inject(),
+) -> None:
+    guild_id = ctx.guild_id
+
+    if not guild_id:
+        await ctx.respond("This command can only be used in a server.")
+        return
+
+    await database.get_guild_config(guild_id)
+    await database.update_guild_config(
+        guild_id, default_min_authors=min_authors or None
+    )
+
+    if min_authors:
+        await ctx.respond(
+            f"Auto-slowmode will only apply when at least {min_authors} distinct authors are active in a channel"
+        )
+    else:
+        await ctx.respond(
+            "Auto-slowmode no longer requires a minimum number of authors"
+        )
+    logger.info(
+        f"Auto-slowmode default minimum authors set to {min_authors} for guild {guild_id} by user {ctx.author.id}"
+    )
+
+
+@server_group.include
+@arc.slash_subcommand(
+    "burst-threshold",
+    "Set the combined message rate across all channels that triggers server-wide slowmode",
+)
+async def server_burst_threshold(
+    ctx: arc.GatewayContext,
+    threshold: arc.Option[
+        int,
+        arc.IntParams(
+            "Messages per minute across all channels (0 to disable)",
+            min=0,
+            max=100000,
+        ),
+    ],
+    database: Database = arc.inject(),
+    bursts: BurstDetector = arc.inject(),
+) -> None:
+    guild_id = ctx.guild_id
+
+    if not guild_id:
+        await ctx.respond("This command can only be used in a server.")
+        return
+
+    await database.get_guild_config(guild_id)
+    await database.update_guild_config(guild_id, burst_threshold=threshold or None)
+    bursts.configure(guild_id, threshold or None)
+
+    if threshold:
+        await ctx.respond(
+            f"All enabled channels will get at least {bursts.slowmode}s slowmode when the server exceeds {threshold} messages per minute"
+        )
+    else:
+        await ctx.respond("Server-wide burst detection has been disabled")
+    logger.info(
+        f"Auto-slowmode burst threshold set to {threshold} for guild {guild_id} by user {ctx.author.id}"
+    )
+
+
 @auto_slowmode.include
 @arc.slash_subcommand("stats", "View current activity and slowmode statistics")
 async def stats(
@@ -249,6 +408,9 @@ async def stats(
         arc.ChannelParams("The channel to view statistics for"),
     ] = None,
     database: Database = arc.inject(),
+    author_tracker: AuthorTracker = arc.inject(),
+    forecasts: ForecastTracker = arc.inject(),
+    bursts: BurstDetector = arc.inject(),
 ) -> None:
     if not channel:
         channel_in = ctx.channel
@@ -285,34 +447,56 @@ async def stats(
     message_count_5m = await database.get_channel_activity(channel_in.id, 300)
     message_count_15m = await database.get_channel_activity(channel_in.id, 900)
 
+    # Persisted and in-memory sketches overlap; merging them is idempotent.
+    authors = {}
+    for window in (60, 300, 900):
+        sketch = await database.get_author_sketch(channel_in.id, window)
+        sketch.merge(author_tracker.sketch(channel_in.id, window))
+        authors[window] = sketch.count()
+
     channel_slowmode = await ctx.client.app.rest.fetch_channel(channel_in.id)
 
     current_slowmode = 0
     if isinstance(channel_slowmode, hikari.GuildTextChannel):
-        if channel_slowmode.rate_limit_per_user is not None:
-            if isinstance(channel_slowmode.rate_limit_per_user, datetime.timedelta):
-                current_slowmode = int(
-                    channel_slowmode.rate_limit_per_user.total_seconds()
-                )
-            else:
-                current_slowmode = int(channel_slowmode.rate_limit_per_user)
+        current_slowmode = get_slowmode_seconds(channel_slowmode)
 
     threshold = channel_config["threshold"] or guild_config["default_threshold"]
+    burst_threshold = guild_config["burst_threshold"]
+    min_authors = channel_config["min_authors"] or guild_config["default_min_authors"]
 
     current_rate = calculate_message_rate(channel_in.id)
 
+    forecaster = forecasts.get(channel_in.id)
+    if forecasts.horizon <= 0:
+        forecast_line = "• Forecast: disabled\n"
+    elif forecaster is None:
+        forecast_line = "• Forecast: no recent messages\n"
+    else:
+        forecast_line = (
+            f"• Forecast ({forecasts.horizon:.0f}s ahead): "
+            f"{forecasts.project(forecaster):.1f} msg/min "
+            f"(±{forecaster.error_rate:.1f})\n"
+        )
+
     rate_5m = message_count_5m / 5 if message_count_5m > 0 else 0
     rate_15m = message_count_15m / 15 if message_count_15m > 0 else 0
 
     response = (
         f"**Auto-Slowmode Statistics for {channel_in.mention}**\n\n"
         f"**Status:** {'Enabled' if channel_enabled and guild_enabled else 'Partially Enabled'}\n"
-        f"**Message Rate Threshold:** {threshold} messages per minute\n\n"
+        f"**Message Rate Threshold:** {threshold} messages per minute\n"
+        f"**Minimum Distinct Authors:** {min_authors or 'None'}\n"
+        f"**Server Burst Threshold:** "
+        f"{f'{burst_threshold} messages per minute' if burst_threshold else 'None'}"
+        f"{' (burst active)' if bursts.is_active(guild_id) else ''}\n\n"
         f"**Current Activity:**\n"
         f"• Current rate: {current_rate:.1f} messages per minute\n"
+        f"{forecast_line}"
+        f"• Server-wide rate: {bursts.rate(guild_id)} messages per minute\n"
         f"• Last minute: {message_count_1m} messages ({message_count_1m} msg/min)\n"
         f"• Last 5 minutes: {message_count_5m} messages ({rate_5m:.1f} msg/min avg)\n"
-        f"• Last 15 minutes: {message_count_15m} messages ({rate_15m:.1f} msg/min avg)\n\n"
+        f"• Last 15 minutes: {message_count_15m} messages ({rate_15m:.1f} msg/min avg)\n"
+        f"• Distinct authors: ~{authors[60]} (1m), ~{authors[300]} (5m), ~{authors[900]} (15m)\n\n"
         f"**Current Slowmode:** {current_slowmode} seconds"
     )
 
@@ -328,6 +512,135 @@ async def stats(
     await ctx.respond(embed=embed)
 
 
+EXPORT_UPLOAD_LIMIT = 10 * 1024 * 1024
+EMBED_DESCRIPTION_LIMIT = 4096
+
+
+@auto_slowmode.include
+@arc.slash_subcommand("export", "Export recorded message activity as a compressed file")
+async def export(
+    ctx: arc.GatewayContext,
+    export_format: arc.Option[
+        str,
+        arc.StrParams(
+            "The file format to export", name="format", choices=list(EXPORT_FORMATS)
+        ),
+    ] = "csv",
+    scope: arc.Option[
+        str,
+        arc.StrParams(
+            "Export a single channel or the whole server", choices=["channel", "server"]
+        ),
+    ] = "channel",
+    channel: arc.Option[
+        hikari.TextableGuildChannel | None,
+        arc.ChannelParams("The channel to export activity for"),
+    ] = None,
+    database: Database = arc.inject(),
+) -> None:
+    if not channel:
+        channel_in = ctx.channel
+    else:
+        channel_in = channel
+
+    guild_id = ctx.guild_id
+
+    if not guild_id:
+        await ctx.respond("This command can only be used in a server.")
+        return
+
+    await ctx.defer(flags=hikari.MessageFlag.EPHEMERAL)
+
+    if scope == "server":
+        filters = {"guild_id": guild_id}
+        filename = f"activity-{guild_id}.{export_format}.gz"
+    else:
+        filters = {"channel_id": channel_in.id}
+        filename = f"activity-{channel_in.id}.{export_format}.gz"
+
+    fd, path = tempfile.mkstemp(suffix=".gz")
+    os.close(fd)
+
+    try:
+        with gzip.open(path, "wt", encoding="utf-8", newline="") as stream:
+            rows = await export_activity(database, stream, export_format, **filters)
+
+        if os.path.getsize(path) > EXPORT_UPLOAD_LIMIT:
+            await ctx.respond(
+                "The export is too large to upload. Use `cli.py export` on the database file instead.",
+                flags=hikari.MessageFlag.EPHEMERAL,
+            )
+            return
+
+        await ctx.respond(
+            f"Exported {rows} activity rows.",
+            attachment=hikari.File(path, filename=filename),
+            flags=hikari.MessageFlag.EPHEMERAL,
+        )
+    finally:
+        os.remove(path)
+
+    logger.info(
+        f"Exported {rows} activity rows ({scope}) for guild {guild_id} by user {ctx.author.id}"
+    )
+
+
+@auto_slowmode.include
+@arc.with_hook(arc.owner_only)
+@arc.slash_subcommand("profile", "Profile the next slowmode update ticks")
+async def profile(
+    ctx: arc.GatewayContext,
+    ticks: arc.Option[
+        int, arc.IntParams("The number of ticks to profile", min=1, max=10)
+    ] = 1,
+    profiler: TickProfiler = arc.inject(),
+    load_monitor: LoadMonitor = arc.inject(),
+    event_clock: EventClock = arc.inject(),
+) -> None:
+    await ctx.defer(flags=hikari.MessageFlag.EPHEMERAL)
+
+    try:
+        samples, hot_spots = await profiler.sample(ticks)
+    except RuntimeError as e:
+        await ctx.respond(str(e), flags=hikari.MessageFlag.EPHEMERAL)
+        return
+
+    recent = "\n".join(report.summary() for report in list(profiler.ticks)[-ticks:])
+    hot_spots_text = "\n".join(hot_spots) or "No samples collected."
+
+    header = (
+        f"**Samples:** {samples} over {ticks} tick(s)\n"
+        f"**Load:** `{load_monitor.summary()}`\n"
+        f"**Ingest:** `{event_clock.summary()}`\n\n"
+    )
+    recent_template = "**Recent ticks:**\n```\n{}\n```\n"
+    hot_spots_template = "**Hot spots:**\n```\n{}\n```"
+
+    # Share what's left of the embed description limit between the two
+    # blocks, giving the tick summaries at most half of it.
+    available = (
+        EMBED_DESCRIPTION_LIMIT
+        - len(header)
+        - len(recent_template.format(""))
+        - len(hot_spots_template.format(""))
+    )
+    recent = recent[: available // 2]
+    hot_spots_text = hot_spots_text[: available - len(recent)]
+
+    embed = hikari.Embed(
+        title="Auto Slowmode Profile",
+        description=(
+            header
+            + recent_template.format(recent)
+            + hot_spots_template.format(hot_spots_text)
+        ),
+        color=0x00FFFF,
+    )
+
+    await ctx.respond(embed=embed, flags=hikari.MessageFlag.EPHEMERAL)
+    logger.info(f"Profiled {ticks} slowmode ticks for user {ctx.author.id}")
+
+
 @arc.loader
 def loader(client: arc.GatewayClient) -> None:
     client.add_plugin(plugin)
@@ -0,0 +1,158 @@
+import logging
+import math
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import arc
+
+logger = logging.getLogger("authors")
+
+_MASK_64 = (1 << 64) - 1
+
+
+def _mix64(value: int) -> int:
+    """SplitMix64 finalizer, spreads snowflakes evenly over 64 bits."""
+    value = (value + 0x9E3779B97F4A7C15) & _MASK_64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK_64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK_64
+    return value ^ (value >> 31)
+
+
+class HyperLogLog:
+    """Fixed-size distinct-count sketch.
+
+    Uses 2**precision one-byte registers regardless of how many values are
+    added. Sketches with the same precision merge losslessly, so per-minute
+    sketches can be combined into any window.
+    """
+
+    def __init__(self, precision: int = 8, registers: Optional[bytes] = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = (
+            bytearray(registers) if registers is not None else bytearray(self.size)
+        )
+
+        if len(self.registers) != self.size:
+            raise ValueError("Register count does not match precision")
+
+    def add(self, value: int) -> None:
+        hashed = _mix64(value)
+        index = hashed >> (64 - self.precision)
+        remaining = (hashed << self.precision) & _MASK_64
+        rank = (
+            64 - self.precision + 1 if remaining == 0 else 65 - remaining.bit_length()
+        )
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precision")
+
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0**-register for register in self.registers)
+
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is far more accurate for small cardinalities.
+            estimate = m * math.log(m / zeros)
+
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        return cls(len(data).bit_length() - 1, data)
+
+    @classmethod
+    def union(cls, sketches: Iterable["HyperLogLog"]) -> "HyperLogLog":
+        merged = cls()
+        for sketch in sketches:
+            merged.merge(sketch)
+        return merged
+
+
+class AuthorTracker:
+    """Per-channel, per-minute distinct-author sketches.
+
+    Each channel keeps at most `window_minutes` sketches, so memory per
+    channel is constant however many users post.
+    """
+
+    def __init__(self, window_minutes: int = 15):
+        self.window_seconds = window_minutes * 60
+        self._channels: Dict[int, Dict[int, HyperLogLog]] = {}
+        self._dirty: Set[Tuple[int, int]] = set()
+
+    def record(self, channel_id: int, author_id: int, timestamp: int) -> None:
+        minute = (timestamp // 60) * 60
+        buckets = self._channels.setdefault(channel_id, {})
+
+        sketch = buckets.get(minute)
+        if sketch is None:
+            newest = max(minute, max(buckets, default=minute))
+            cutoff = newest - self.window_seconds
+            if minute <= cutoff:
+                return
+
+            for stale in [bucket for bucket in buckets if bucket <= cutoff]:
+                del buckets[stale]
+
+            sketch = buckets[minute] = HyperLogLog()
+
+        sketch.add(author_id)
+        self._dirty.add((channel_id, minute))
+
+    def sketch(self, channel_id: int, window_seconds: int = 60) -> HyperLogLog:
+        cutoff = time.time() - window_seconds
+        buckets = self._channels.get(channel_id, {})
+        return HyperLogLog.union(
+            sketch for minute, sketch in buckets.items() if minute + 60 > cutoff
+        )
+
+    def estimate(self, channel_id: int, window_seconds: int = 60) -> int:
+        if channel_id not in self._channels:
+            return 0
+        return self.sketch(channel_id, window_seconds).count()
+
+    def drain_dirty(self) -> List[Tuple[int, int, bytes]]:
+        """Return `(channel_id, minute, sketch)` for buckets changed since the last drain."""
+        dirty = []
+        for channel_id, minute in self._dirty:
+            sketch = self._channels.get(channel_id, {}).get(minute)
+            if sketch is not None:
+                dirty.append((channel_id, minute, sketch.to_bytes()))
+        self._dirty.clear()
+        return dirty
+
+    def expire(self) -> None:
+        cutoff = time.time() - self.window_seconds
+        for channel_id in list(self._channels):
+            buckets = self._channels[channel_id]
+            for stale in [minute for minute in buckets if minute + 60 <= cutoff]:
+                del buckets[stale]
+            if not buckets:
+                del self._channels[channel_id]
+
+    def forget(self, channel_id: int) -> None:
+        self._channels.pop(channel_id, None)
+
+
+author_tracker = AuthorTracker()
+
+
+@arc.loader
+def load(client: arc.GatewayClient) -> None:
+    client.set_type_dependency(AuthorTracker, author_tracker)
+
+
+@arc.unloader
+def unload(client: arc.GatewayClient) -> None:
+    pass
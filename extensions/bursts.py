@@ -0,0 +1,142 @@
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+import arc
+
+from .utils import RateWindow
+
+logger = logging.getLogger("bursts")
+
+
+class SlidingCounter(RateWindow):
+    """Fixed-length rate window with a running total.
+
+    Adding a message and reading the total are amortised O(1): each bucket
+    is added to and subtracted from the total exactly once.
+    """
+
+    __slots__ = ("window_seconds", "total", "newest")
+
+    def __init__(self, window_seconds: int = 60):
+        super().__init__()
+        self.window_seconds = window_seconds
+        self.total = 0
+        self.newest = 0.0
+
+    def _expire(self, now: float) -> None:
+        cutoff = int(now - self.window_seconds)
+        while self.buckets and self.buckets[0][0] <= cutoff:
+            self.total -= self.buckets.popleft()[1]
+
+    def add(self, timestamp: float, weight: int = 1) -> int:
+        if timestamp <= self.newest - self.window_seconds:
+            return self.total
+
+        super().add(timestamp, weight)
+        self.total += weight
+
+        self.newest = max(self.newest, timestamp)
+        self._expire(self.newest)
+        return self.total
+
+    def count(self, window_seconds: int, now: float) -> int:
+        # RateWindow.count pops expired buckets without updating the total.
+        self._expire(now)
+        if window_seconds >= self.window_seconds:
+            return self.total
+        cutoff = int(now - window_seconds)
+        return sum(count for second, count in self.buckets if second > cutoff)
+
+    def current(self, now: float) -> int:
+        self._expire(now)
+        return self.total
+
+
+class BurstDetector:
+    """Guild-wide message rate across all channels, checked on every message.
+
+    A guild whose combined rate crosses its burst threshold enters a burst
+    for `cooldown` seconds, during which its channels are held at a slowmode
+    floor of at least `slowmode` seconds.
+    """
+
+    def __init__(
+        self, slowmode: Optional[int] = None, cooldown: Optional[float] = None
+    ):
+        self.slowmode = slowmode or int(os.environ.get("BURST_SLOWMODE", 10))
+        self.cooldown = cooldown or float(os.environ.get("BURST_COOLDOWN", 300))
+
+        self._windows: Dict[int, SlidingCounter] = {}
+        self._thresholds: Dict[int, int] = {}
+        self._active_until: Dict[int, float] = {}
+        self.triggered = 0
+
+    def configure(self, guild_id: int, threshold: Optional[int]) -> None:
+        """Set the guild's threshold in messages per minute, or None to disable."""
+        if threshold:
+            self._thresholds[guild_id] = threshold
+        else:
+            self._thresholds.pop(guild_id, None)
+            self._active_until.pop(guild_id, None)
+
+    def record(self, guild_id: int, timestamp: float, weight: int = 1) -> bool:
+        """Count a message, returning True if it starts a new burst."""
+        window = self._windows.get(guild_id)
+        if window is None:
+            window = self._windows[guild_id] = SlidingCounter()
+        rate = window.add(timestamp, weight)
+
+        threshold = self._thresholds.get(guild_id)
+        if threshold is None or rate < threshold:
+            return False
+
+        active = self.is_active(guild_id, timestamp)
+        self._active_until[guild_id] = timestamp + self.cooldown
+        if active:
+            return False
+
+        self.triggered += 1
+        logger.warning(
+            f"Guild {guild_id} burst: {rate} msg/min across channels (threshold: {threshold})"
+        )
+        return True
+
+    def is_active(self, guild_id: int, now: Optional[float] = None) -> bool:
+        active_until = self._active_until.get(guild_id)
+        if active_until is None:
+            return False
+        if active_until <= (now or time.time()):
+            del self._active_until[guild_id]
+            return False
+        return True
+
+    def floor(self, guild_id: int) -> int:
+        """Minimum slowmode for the guild's channels, 0 outside a burst."""
+        return self.slowmode if self.is_active(guild_id) else 0
+
+    def rate(self, guild_id: int) -> int:
+        window = self._windows.get(guild_id)
+        return window.current(time.time()) if window is not None else 0
+
+    def threshold(self, guild_id: int) -> Optional[int]:
+        return self._thresholds.get(guild_id)
+
+    def forget(self, guild_id: int) -> None:
+        self._windows.pop(guild_id, None)
+        self._thresholds.pop(guild_id, None)
+        self._active_until.pop(guild_id, None)
+
+
+burst_detector = BurstDetector()
+
+
+@arc.loader
+def load(client: arc.GatewayClient) -> None:
+    client.set_type_dependency(BurstDetector, burst_detector)
+
+
+@arc.unloader
+def unload(client: arc.GatewayClient) -> None:
+    pass
@@ -1,203 +1,642 @@
 import asyncio
-import datetime
 import logging
 import random
 import time
+from typing import Set
 
 import arc
 import hikari
 
+from .authors import AuthorTracker
+from .bursts import BurstDetector
 from .db import Database
-from .utils import calculate_message_rate, determine_optimal_slowmode, message_cache
+from .forecast import ForecastTracker
+from .ingest import EventClock
+from .loadshed import LoadMonitor
+from .permissions import PermissionCache
+from .profiling import TickProfiler
+from .ratelimit import EditBudget
+from .utils import (
+    calculate_message_rate,
+    calculate_message_rates,
+    evaluate_slowmode_levels,
+    get_slowmode_seconds,
+    record_message_rate,
+)
 
 logger = logging.getLogger("core")
 
 plugin = arc.GatewayPlugin("core")
 
+# Strong references to running burst applies so they aren't garbage collected.
+burst_tasks: Set[asyncio.Task[None]] = set()
+
 
 @plugin.listen()
 async def on_message_create(event: hikari.MessageCreateEvent) -> None:
     if event.is_bot or not event.is_human:
         return
 
-    if not event.message.guild_id:
+    guild_id = event.message.guild_id
+    if not guild_id:
+        return
+
+    event_clock = plugin.client.get_type_dependency(EventClock)
+    if event_clock.is_duplicate(event.message_id):
         return
 
     channel_id = event.channel_id
-    timestamp = int(event.message.timestamp.timestamp())
+    sent_at = event.message.timestamp.timestamp()
+    timestamp = int(sent_at)
+
+    # Recorded before sampling: a sketch update is O(1), and sampled
+    # sketches would undercount distinct authors exactly when a raid pushes
+    # the load level up.
+    author_tracker = plugin.client.get_type_dependency(AuthorTracker)
+    author_tracker.record(channel_id, event.author_id, timestamp)
+
+    load_monitor = plugin.client.get_type_dependency(LoadMonitor)
+    weight = load_monitor.admit()
+    if not weight:
+        return
 
-    db = plugin.client.get_type_dependency(Database)
+    # Window messages by when they were sent, not when they arrived, so a
+    # replayed backlog after a reconnect doesn't look like a spike. Late
+    # messages are still persisted below, the database is keyed by event
+    # time too.
+    event_time = event_clock.observe(sent_at, time.time(), event.shard.id)
+    if event_time is not None:
+        record_message_rate(channel_id, event_time, weight)
+
+        forecasts = plugin.client.get_type_dependency(ForecastTracker)
+        forecasts.record(channel_id, event_time, weight)
+
+        bursts = plugin.client.get_type_dependency(BurstDetector)
+        if bursts.record(guild_id, event_time, weight):
+            task = asyncio.create_task(apply_burst(plugin.client, guild_id))
+            burst_tasks.add(task)
+            task.add_done_callback(burst_tasks.discard)
+
+    if load_monitor.persist_messages:
+        db = plugin.client.get_type_dependency(Database)
+        db.record_message(channel_id, timestamp, weight)
+    else:
+        load_monitor.unpersisted += weight
+
+
+async def apply_slowmode(
+    client: arc.GatewayClient,
+    database: Database,
+    permissions: PermissionCache,
+    profiler: TickProfiler,
+    load_monitor: LoadMonitor,
+    channel_id: int,
+    current_slowmode: int,
+    optimal_slowmode: int,
+    message_rate: float,
+    threshold: int,
+) -> None:
+    """Edit the channel's slowmode and notify the channel.
+
+    Raises hikari.RateLimitTooLongError if the edit would wait on Discord's
+    rate limits, so the caller can defer it.
+    """
+    with profiler.phase("jitter", channel_id):
+        jitter = random.uniform(0.1, 2.0)
+        await asyncio.sleep(jitter)
 
-    await db.record_message(channel_id, timestamp)
+    try:
+        with profiler.phase("edit_channel", channel_id):
+            await client.app.rest.edit_channel(
+                channel_id, rate_limit_per_user=optimal_slowmode
+            )
+    except hikari.RateLimitTooLongError:
+        raise
+    except hikari.ForbiddenError:
+        logger.warning(f"No permission to update slowmode for channel {channel_id}")
+        permissions.forget(channel_id)
+        # Update the database to disable this channel since we can't manage it
+        await database.update_channel_config(channel_id, is_enabled=0)
+        return
+    except Exception as e:
+        logger.error(f"Error updating slowmode for channel {channel_id}: {str(e)}")
+        return
 
-    if channel_id not in message_cache:
-        message_cache[channel_id] = []
+    permissions.confirm_manage(channel_id)
+
+    if current_slowmode == 0 and optimal_slowmode > 0:
+        description = f"Slowmode has been enabled ({optimal_slowmode} seconds) due to high message volume."
+        color = 0xFFA500  # Orange for warning
+    elif current_slowmode > 0 and optimal_slowmode == 0:
+        description = (
+            "Slowmode has been disabled as message volume has returned to normal."
+        )
+        color = 0x00FF00  # Green for positive
+    elif optimal_slowmode > current_slowmode:
+        description = f"Slowmode increased from {current_slowmode}s to {optimal_slowmode}s due to continued high message volume."
+        color = 0xFF0000  # Red for restrictive
+    else:
+        description = f"Slowmode reduced from {current_slowmode}s to {optimal_slowmode}s as message volume decreased."
+        color = 0x00FFFF  # Cyan for less restrictive
+
+    embed = hikari.Embed(
+        title="Auto Slowmode Update",
+        description=description,
+        color=color,
+    )
+
+    if permissions.can_notify(channel_id) is False:
+        logger.debug(
+            "Skipping notification in channel %s, missing send permissions",
+            channel_id,
+        )
+    elif not load_monitor.run_low_priority:
+        logger.debug("Skipping notification in channel %s, shedding load", channel_id)
+    else:
+        try:
+            with profiler.phase("notify", channel_id):
+                await client.app.rest.create_message(channel_id, embed=embed)
+            permissions.confirm_notify(channel_id)
+        except hikari.ForbiddenError:
+            # Can't send messages but can still set slowmode
+            logger.warning(f"No permission to send messages in channel {channel_id}")
+            permissions.forget(channel_id)
+        except Exception as e:
+            logger.error(
+                f"Error sending notification in channel {channel_id}: {str(e)}"
+            )
+
+    logger.info(
+        f"Updated slowmode for channel {channel_id} from {current_slowmode}s to {optimal_slowmode}s "
+        f"(rate: {message_rate:.2f} msg/min, threshold: {threshold})"
+    )
+
+
+async def request_slowmode(
+    client: arc.GatewayClient,
+    database: Database,
+    permissions: PermissionCache,
+    profiler: TickProfiler,
+    load_monitor: LoadMonitor,
+    edit_budget: EditBudget,
+    channel_id: int,
+    current_slowmode: int,
+    optimal_slowmode: int,
+    message_rate: float,
+    threshold: int,
+) -> None:
+    """Apply a slowmode change if the channel has edit budget, otherwise defer it."""
+    pending = edit_budget.pending(channel_id)
+    if pending is not None:
+        # Collapse into the queued edit; the flush loop sends the final value.
+        edit_budget.defer(
+            channel_id, current_slowmode, optimal_slowmode, message_rate, threshold
+        )
+        return
 
-    message_cache[channel_id].append(time.time())
+    if not edit_budget.try_acquire(channel_id):
+        edit_budget.defer(
+            channel_id, current_slowmode, optimal_slowmode, message_rate, threshold
+        )
+        return
+
+    try:
+        await apply_slowmode(
+            client,
+            database,
+            permissions,
+            profiler,
+            load_monitor,
+            channel_id,
+            current_slowmode,
+            optimal_slowmode,
+            message_rate,
+            threshold,
+        )
+    except hikari.RateLimitTooLongError as e:
+        logger.warning(
+            f"Edit rate limit hit for channel {channel_id}, deferring for {e.retry_after:.1f}s"
+        )
+        edit_budget.sync_from_rate_limit(channel_id, e)
+        edit_budget.defer(
+            channel_id, current_slowmode, optimal_slowmode, message_rate, threshold
+        )
+
+
+async def apply_burst(client: arc.GatewayClient, guild_id: int) -> None:
+    """Raise every enabled channel in the guild to the burst floor at once."""
+    database = client.get_type_dependency(Database)
+    permissions = client.get_type_dependency(PermissionCache)
+    profiler = client.get_type_dependency(TickProfiler)
+    load_monitor = client.get_type_dependency(LoadMonitor)
+    edit_budget = client.get_type_dependency(EditBudget)
+    bursts = client.get_type_dependency(BurstDetector)
+
+    floor = bursts.floor(guild_id)
+    if not floor:
+        return
+
+    guild_config = await database.get_guild_config(guild_id)
+    channels = await database.get_enabled_channels(guild_id)
+
+    async def raise_channel(channel_config: dict) -> bool:
+        channel_id = channel_config["channel_id"]
+        if permissions.can_manage(channel_id) is False:
+            return False
+
+        channel = client.app.cache.get_guild_channel(channel_id)
+        if channel is None:
+            channel = await client.app.rest.fetch_channel(channel_id)
+        if not isinstance(channel, hikari.GuildTextChannel):
+            return False
+
+        current_slowmode = get_slowmode_seconds(channel)
+        if current_slowmode >= floor:
+            return False
+
+        await request_slowmode(
+            client,
+            database,
+            permissions,
+            profiler,
+            load_monitor,
+            edit_budget,
+            channel_id,
+            current_slowmode,
+            floor,
+            calculate_message_rate(channel_id),
+            channel_config["threshold"] or guild_config["default_threshold"],
+        )
+        return True
+
+    results = await asyncio.gather(
+        *(raise_channel(channel_config) for channel_config in channels),
+        return_exceptions=True,
+    )
+
+    for channel_config, result in zip(channels, results):
+        if isinstance(result, Exception):
+            logger.error(
+                f"Error applying burst slowmode to channel {channel_config['channel_id']}: {str(result)}"
+            )
+
+    logger.info(
+        f"Raised {sum(result is True for result in results)} of {len(channels)} "
+        f"channels in guild {guild_id} to {floor}s slowmode for a guild-wide burst"
+    )
 
 
 @arc.utils.interval_loop(seconds=30)
-async def update_slowmode(client: arc.GatewayClient, database: Database) -> None:
+async def update_slowmode(
+    client: arc.GatewayClient,
+    database: Database,
+    permissions: PermissionCache,
+    profiler: TickProfiler,
+    load_monitor: LoadMonitor,
+    edit_budget: EditBudget,
+    author_tracker: AuthorTracker,
+    forecasts: ForecastTracker,
+    bursts: BurstDetector,
+    event_clock: EventClock,
+) -> None:
+    with profiler.tick() as report:
+        report.load_level = load_monitor.level.name
+        report.late, report.duplicates = event_clock.take_recent()
+        if report.late or report.duplicates:
+            logger.info(
+                f"Kept {report.late} late and {report.duplicates} duplicate messages "
+                f"out of the rate windows since the last update"
+            )
+        await run_slowmode_tick(
+            client,
+            database,
+            permissions,
+            profiler,
+            load_monitor,
+            edit_budget,
+            author_tracker,
+            forecasts,
+            bursts,
+        )
+
+
+async def run_slowmode_tick(
+    client: arc.GatewayClient,
+    database: Database,
+    permissions: PermissionCache,
+    profiler: TickProfiler,
+    load_monitor: LoadMonitor,
+    edit_budget: EditBudget,
+    author_tracker: AuthorTracker,
+    forecasts: ForecastTracker,
+    bursts: BurstDetector,
+) -> None:
     try:
-        enabled_guilds = await database.get_enabled_guilds()
-        logger.debug(f"Found {len(enabled_guilds)} enabled guilds")
+        with profiler.phase("sql"):
+            enabled_guilds = await database.get_enabled_guilds()
+        logger.debug("Found %d enabled guilds", len(enabled_guilds))
 
         for guild_config in enabled_guilds:
             guild_id = guild_config["guild_id"]
 
             try:
-                logger.debug(f"Processing guild {guild_id} with config: {guild_config}")
-
-                channels = await database.get_enabled_channels(guild_id)
-                logger.debug(
-                    f"Processing {len(channels)} channels for guild {guild_id}"
-                )
+                with profiler.guild(guild_id):
+                    await process_guild(
+                        client,
+                        database,
+                        permissions,
+                        profiler,
+                        load_monitor,
+                        edit_budget,
+                        author_tracker,
+                        forecasts,
+                        bursts,
+                        guild_config,
+                    )
+            except Exception as e:
+                logger.error(f"Error processing guild {guild_id}: {str(e)}")
 
-                for channel_config in channels:
-                    channel_id = channel_config["channel_id"]
+    except Exception as e:
+        logger.error(f"Error in slowmode update loop: {str(e)}")
 
-                    message_rate = calculate_message_rate(channel_id)
 
-                    current_db_activity = await database.get_channel_activity(
-                        channel_id, 300
+async def process_guild(
+    client: arc.GatewayClient,
+    database: Database,
+    permissions: PermissionCache,
+    profiler: TickProfiler,
+    load_monitor: LoadMonitor,
+    edit_budget: EditBudget,
+    author_tracker: AuthorTracker,
+    forecasts: ForecastTracker,
+    bursts: BurstDetector,
+    guild_config: dict,
+) -> None:
+    guild_id = guild_config["guild_id"]
+    logger.debug("Processing guild %s with config: %s", guild_id, guild_config)
+
+    bursts.configure(guild_id, guild_config["burst_threshold"])
+
+    with profiler.phase("sql"):
+        channels = await database.get_enabled_channels(guild_id)
+    logger.debug("Processing %d channels for guild %s", len(channels), guild_id)
+
+    channel_ids = [channel_config["channel_id"] for channel_config in channels]
+    thresholds = [
+        channel_config["threshold"] or guild_config["default_threshold"]
+        for channel_config in channels
+    ]
+
+    with profiler.phase("evaluate"):
+        message_rates = calculate_message_rates(channel_ids)
+
+        # Act on the projected rate when a channel is trending towards its
+        # threshold, instead of waiting for the trailing window to fill up.
+        projected_rates = forecasts.projected_rates(channel_ids)
+        message_rates = [
+            max(message_rate, projected_rate)
+            for message_rate, projected_rate in zip(message_rates, projected_rates)
+        ]
+        targets = evaluate_slowmode_levels(message_rates, thresholds)
+
+        # A burst from too few people (e.g. one spammer) shouldn't slow down
+        # the whole channel.
+        for index, channel_config in enumerate(channels):
+            min_authors = (
+                channel_config["min_authors"] or guild_config["default_min_authors"]
+            )
+            if targets[index] and min_authors:
+                authors = author_tracker.estimate(channel_ids[index], 60)
+                if authors < min_authors:
+                    logger.debug(
+                        "Channel %s has %d distinct authors, below minimum %d",
+                        channel_ids[index],
+                        authors,
+                        min_authors,
                     )
+                    targets[index] = 0
+
+        # During a guild-wide burst, don't lower any channel below the floor
+        # the burst apply raised it to.
+        burst_floor = bursts.floor(guild_id)
+        if burst_floor:
+            targets = [max(target, burst_floor) for target in targets]
+
+    # Only channels whose target differs from their known level need any
+    # further work; channels missing from the cache are checked over REST.
+    candidates = []
+    for channel_id, message_rate, threshold, optimal_slowmode in zip(
+        channel_ids, message_rates, thresholds, targets
+    ):
+        current_slowmode = None
+        cached_channel = client.app.cache.get_guild_channel(channel_id)
+        if cached_channel is not None:
+            if not isinstance(cached_channel, hikari.GuildTextChannel):
+                continue
+
+            current_slowmode = get_slowmode_seconds(cached_channel)
+            if current_slowmode == optimal_slowmode:
+                edit_budget.discard(channel_id)
+                continue
+
+        candidates.append(
+            (channel_id, message_rate, threshold, optimal_slowmode, current_slowmode)
+        )
+
+    if load_monitor.prioritise_channels:
+        # Under heavy load, handle the channels furthest over their threshold
+        # first and leave lowering slowmode until things calm down.
+        candidates = [
+            candidate
+            for candidate in candidates
+            if candidate[4] is None or candidate[3] > candidate[4]
+        ]
+        candidates.sort(key=lambda candidate: candidate[1] / candidate[2], reverse=True)
+
+    logger.debug(
+        "%d of %d channels in guild %s need a slowmode change",
+        len(candidates),
+        len(channels),
+        guild_id,
+    )
+
+    idle_channel_ids = [candidate[0] for candidate in candidates if candidate[1] == 0]
+    with profiler.phase("sql"):
+        db_activity = await database.get_channels_activity(idle_channel_ids, 300)
+
+    for (
+        channel_id,
+        message_rate,
+        threshold,
+        optimal_slowmode,
+        current_slowmode,
+    ) in candidates:
+        if message_rate == 0 and db_activity.get(channel_id) == 0:
+            logger.debug("Skipping channel %s with no recent activity", channel_id)
+            continue
+
+        if permissions.can_manage(channel_id) is False:
+            logger.debug("Skipping channel %s, missing manage permissions", channel_id)
+            continue
+
+        try:
+            if current_slowmode is None:
+                with profiler.phase("fetch_channel", channel_id):
+                    channel = await client.app.rest.fetch_channel(channel_id)
+
+                if not isinstance(channel, hikari.GuildTextChannel):
+                    logger.debug(
+                        "Channel %s is not a text channel, skipping", channel_id
+                    )
+                    continue
+
+                current_slowmode = get_slowmode_seconds(channel)
+
+            logger.debug(
+                "Channel %s: rate %.2f msg/min, threshold %s msg/min, slowmode %ss -> %ss",
+                channel_id,
+                message_rate,
+                threshold,
+                current_slowmode,
+                optimal_slowmode,
+            )
+
+            if current_slowmode != optimal_slowmode:
+                await request_slowmode(
+                    client,
+                    database,
+                    permissions,
+                    profiler,
+                    load_monitor,
+                    edit_budget,
+                    channel_id,
+                    current_slowmode,
+                    optimal_slowmode,
+                    message_rate,
+                    threshold,
+                )
+            else:
+                edit_budget.discard(channel_id)
+        except hikari.ForbiddenError:
+            logger.warning(
+                f"No access to channel {channel_id}, disabling it in auto-slowmode"
+            )
+            permissions.forget(channel_id)
+            # Update the database to disable this channel since we can't access it
+            await database.update_channel_config(channel_id, is_enabled=0)
+        except hikari.NotFoundError:
+            logger.warning(
+                f"Channel {channel_id} not found (deleted?), disabling it in auto-slowmode"
+            )
+            # Update the database to disable this channel since it doesn't exist
+            await database.update_channel_config(channel_id, is_enabled=0)
+        except Exception as e:
+            logger.error(f"Error processing channel {channel_id}: {str(e)}")
+
+
+@arc.utils.interval_loop(seconds=5)
+async def flush_deferred_edits(
+    client: arc.GatewayClient,
+    database: Database,
+    permissions: PermissionCache,
+    profiler: TickProfiler,
+    load_monitor: LoadMonitor,
+    edit_budget: EditBudget,
+) -> None:
+    ready = edit_budget.pop_ready()
+    if not ready:
+        return
 
-                    if message_rate == 0 and current_db_activity == 0:
-                        logger.debug(
-                            f"Skipping channel {channel_id} with no recent activity"
-                        )
-                        continue
-
-                    try:
-                        channel = await client.app.rest.fetch_channel(channel_id)
-
-                        if not isinstance(channel, hikari.GuildTextChannel):
-                            logger.debug(
-                                f"Channel {channel_id} is not a text channel, skipping"
-                            )
-                            continue
-
-                        logger.debug(
-                            f"Channel {channel_id} has message rate: {message_rate:.2f} msg/min"
-                        )
-
-                        threshold = (
-                            channel_config["threshold"]
-                            or guild_config["default_threshold"]
-                        )
-                        logger.debug(
-                            f"Channel {channel_id} has threshold: {threshold} msg/min"
-                        )
-
-                        optimal_slowmode = await determine_optimal_slowmode(
-                            message_rate, threshold
-                        )
-                        logger.debug(
-                            f"Optimal slowmode for channel {channel_id}: {optimal_slowmode}s"
-                        )
-
-                        current_slowmode = 0
-                        if hasattr(channel, "rate_limit_per_user"):
-                            if channel.rate_limit_per_user is not None:
-                                if isinstance(
-                                    channel.rate_limit_per_user, datetime.timedelta
-                                ):
-                                    current_slowmode = int(
-                                        channel.rate_limit_per_user.total_seconds()
-                                    )
-                                else:
-                                    current_slowmode = int(channel.rate_limit_per_user)
-
-                        logger.debug(
-                            f"Current slowmode for channel {channel_id}: {current_slowmode}s"
-                        )
-
-                        if current_slowmode != optimal_slowmode:
-                            jitter = random.uniform(0.1, 2.0)
-                            await asyncio.sleep(jitter)
-
-                            try:
-                                await client.app.rest.edit_channel(
-                                    channel_id, rate_limit_per_user=optimal_slowmode
-                                )
-
-                                if current_slowmode == 0 and optimal_slowmode > 0:
-                                    description = f"Slowmode has been enabled ({optimal_slowmode} seconds) due to high message volume."
-                                    color = 0xFFA500  # Orange for warning
-                                elif current_slowmode > 0 and optimal_slowmode == 0:
-                                    description = "Slowmode has been disabled as message volume has returned to normal."
-                                    color = 0x00FF00  # Green for positive
-                                elif optimal_slowmode > current_slowmode:
-                                    description = f"Slowmode increased from {current_slowmode}s to {optimal_slowmode}s due to continued high message volume."
-                                    color = 0xFF0000  # Red for restrictive
-                                else:
-                                    description = f"Slowmode reduced from {current_slowmode}s to {optimal_slowmode}s as message volume decreased."
-                                    color = 0x00FFFF  # Cyan for less restrictive
-
-                                embed = hikari.Embed(
-                                    title="Auto Slowmode Update",
-                                    description=description,
-                                    color=color,
-                                )
-
-                                try:
-                                    await client.app.rest.create_message(
-                                        channel.id,
-                                        embed=embed,
-                                    )
-                                except hikari.ForbiddenError:
-                                    # Can't send messages but can still set slowmode
-                                    logger.warning(
-                                        f"No permission to send messages in channel {channel_id}"
-                                    )
-                                except Exception as e:
-                                    logger.error(
-                                        f"Error sending notification in channel {channel_id}: {str(e)}"
-                                    )
-
-                                logger.info(
-                                    f"Updated slowmode for channel {channel_id} from {current_slowmode}s to {optimal_slowmode}s "
-                                    f"(rate: {message_rate:.2f} msg/min, threshold: {threshold})"
-                                )
-                            except hikari.ForbiddenError:
-                                logger.warning(
-                                    f"No permission to update slowmode for channel {channel_id}"
-                                )
-                                # Update the database to disable this channel since we can't manage it
-                                await database.update_channel_config(
-                                    channel_id, is_enabled=0
-                                )
-                            except Exception as e:
-                                logger.error(
-                                    f"Error updating slowmode for channel {channel_id}: {str(e)}"
-                                )
-
-                    except hikari.ForbiddenError:
-                        logger.warning(
-                            f"No access to channel {channel_id}, disabling it in auto-slowmode"
-                        )
-                        # Update the database to disable this channel since we can't access it
-                        await database.update_channel_config(channel_id, is_enabled=0)
-                    except hikari.NotFoundError:
-                        logger.warning(
-                            f"Channel {channel_id} not found (deleted?), disabling it in auto-slowmode"
-                        )
-                        # Update the database to disable this channel since it doesn't exist
-                        await database.update_channel_config(channel_id, is_enabled=0)
-                    except Exception as e:
-                        logger.error(f"Error processing channel {channel_id}: {str(e)}")
+    # A channel may have been disabled while its edit was queued.
+    try:
+        enabled = set(
+            await database.get_enabled_channel_ids([edit.channel_id for edit in ready])
+        )
+    except Exception as e:
+        logger.error(f"Error checking deferred slowmode channels: {str(e)}")
+        for edit in ready:
+            edit_budget.defer(
+                edit.channel_id,
+                edit.current_slowmode,
+                edit.desired_slowmode,
+                edit.message_rate,
+                edit.threshold,
+            )
+        return
 
-            except Exception as e:
-                logger.error(f"Error processing guild {guild_id}: {str(e)}")
+    for edit in ready:
+        if edit.channel_id not in enabled:
+            logger.debug(
+                "Dropping deferred slowmode for disabled channel %s", edit.channel_id
+            )
+            continue
+
+        try:
+            await apply_slowmode(
+                client,
+                database,
+                permissions,
+                profiler,
+                load_monitor,
+                edit.channel_id,
+                edit.current_slowmode,
+                edit.desired_slowmode,
+                edit.message_rate,
+                edit.threshold,
+            )
+        except hikari.RateLimitTooLongError as e:
+            edit_budget.sync_from_rate_limit(edit.channel_id, e)
+            edit_budget.defer(
+                edit.channel_id,
+                edit.current_slowmode,
+                edit.desired_slowmode,
+                edit.message_rate,
+                edit.threshold,
+            )
+        except Exception as e:
+            logger.error(
+                f"Error applying deferred slowmode for channel {edit.channel_id}: {str(e)}"
+            )
+
+
+@arc.utils.interval_loop(seconds=10)
+async def flush_activity(database: Database) -> None:
+    try:
+        rows = await database.flush_activity()
+        if rows:
+            logger.debug("Flushed %d activity rows", rows)
+    except Exception as e:
+        logger.error(f"Error flushing message activity: {str(e)}")
 
+
+@arc.utils.interval_loop(seconds=60)
+async def flush_author_sketches(
+    database: Database, author_tracker: AuthorTracker, load_monitor: LoadMonitor
+) -> None:
+    if not load_monitor.run_low_priority:
+        logger.debug("Skipping author sketch persistence, shedding load")
+        return
+
+    try:
+        await database.save_author_sketches(author_tracker.drain_dirty())
+        author_tracker.expire()
     except Exception as e:
-        logger.error(f"Error in slowmode update loop: {str(e)}")
+        logger.error(f"Error saving author sketches: {str(e)}")
 
 
 @arc.utils.interval_loop(hours=1)
-async def cleanup_old_data(database: Database = arc.inject()) -> None:
+async def cleanup_old_data(
+    database: Database = arc.inject(),
+    load_monitor: LoadMonitor = arc.inject(),
+    forecasts: ForecastTracker = arc.inject(),
+) -> None:
+    if not load_monitor.run_low_priority:
+        logger.info("Skipping old message cleanup, shedding load")
+        return
+
     try:
         await database.cleanup_old_messages(max_age=86400)
+        forecasts.expire()
         logger.info("Cleaned up old message data")
     except Exception as e:
         logger.error(f"Error cleaning up old message data: {str(e)}")
@@ -208,9 +647,50 @@ async def on_started(_: hikari.StartedEvent) -> None:
     await asyncio.sleep(1)
 
     database = plugin.client.get_type_dependency(Database)
-
-    update_slowmode.start(client=plugin.client, database=database)
-    cleanup_old_data.start(database=database)
+    permissions = plugin.client.get_type_dependency(PermissionCache)
+    profiler = plugin.client.get_type_dependency(TickProfiler)
+    load_monitor = plugin.client.get_type_dependency(LoadMonitor)
+    edit_budget = plugin.client.get_type_dependency(EditBudget)
+    author_tracker = plugin.client.get_type_dependency(AuthorTracker)
+    forecasts = plugin.client.get_type_dependency(ForecastTracker)
+    bursts = plugin.client.get_type_dependency(BurstDetector)
+    event_clock = plugin.client.get_type_dependency(EventClock)
+
+    # Otherwise thresholds only arrive with each guild's first tick, and a
+    # burst right after a restart would go unnoticed until then.
+    try:
+        for guild_id, threshold in (await database.get_burst_thresholds()).items():
+            bursts.configure(guild_id, threshold)
+    except Exception as e:
+        logger.error(f"Error loading burst thresholds: {str(e)}")
+
+    update_slowmode.start(
+        client=plugin.client,
+        database=database,
+        permissions=permissions,
+        profiler=profiler,
+        load_monitor=load_monitor,
+        edit_budget=edit_budget,
+        author_tracker=author_tracker,
+        forecasts=forecasts,
+        bursts=bursts,
+        event_clock=event_clock,
+    )
+    flush_deferred_edits.start(
+        client=plugin.client,
+        database=database,
+        permissions=permissions,
+        profiler=profiler,
+        load_monitor=load_monitor,
+        edit_budget=edit_budget,
+    )
+    flush_activity.start(database=database)
+    flush_author_sketches.start(
+        database=database, author_tracker=author_tracker, load_monitor=load_monitor
+    )
+    cleanup_old_data.start(
+        database=database, load_monitor=load_monitor, forecasts=forecasts
+    )
 
     logger.info("Auto-slowmode loops started")
 
@@ -223,5 +703,8 @@ def loader(client: arc.GatewayClient) -> None:
 @arc.unloader
 def unloader(client: arc.GatewayClient) -> None:
     update_slowmode.stop()
+    flush_deferred_edits.stop()
+    flush_activity.stop()
+    flush_author_sketches.stop()
     cleanup_old_data.stop()
     client.remove_plugin(plugin)
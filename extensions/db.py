@@ -1,13 +1,43 @@
+import asyncio
 import logging
 import os
+import sys
+import time
+from array import array
 from pathlib import Path
-from typing import List, Optional
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
 
 import aiosqlite
 import arc
 
+from .authors import HyperLogLog
+
 logger = logging.getLogger("db")
 
+# Bumped whenever init() has to migrate existing data, tracked in PRAGMA user_version.
+SCHEMA_VERSION = 1
+
+MINUTES_PER_HOUR = 60
+MAX_MINUTE_COUNT = 0xFFFF
+# Keys per SELECT when merging buffered increments, well under SQLite's
+# bound parameter limit.
+FLUSH_BATCH_SIZE = 400
+
+
+def unpack_counts(data: bytes) -> array:
+    """Decode an hour row's little-endian uint16 per-minute counters."""
+    counts = array("H", data)
+    if sys.byteorder == "big":
+        counts.byteswap()
+    return counts
+
+
+def pack_counts(counts: array) -> bytes:
+    if sys.byteorder == "big":
+        counts = array("H", counts)
+        counts.byteswap()
+    return counts.tobytes()
+
 
 class Database:
     def __init__(self, db_path: Optional[str] = None):
@@ -17,6 +47,14 @@ class Database:
 
         Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
 
+        # Per-minute increments not yet merged into activity_hours, keyed by
+        # (channel_id, hour).
+        self._pending: Dict[Tuple[int, int], array] = {}
+        # Held while increments are being merged, so overlapping flushes
+        # don't overwrite each other and readers never see them twice or
+        # not at all.
+        self._activity_lock = asyncio.Lock()
+
     async def init(self) -> None:
         self.connection = await aiosqlite.connect(self.db_path)
         self.connection.row_factory = aiosqlite.Row
@@ -26,7 +64,9 @@ class Database:
             guild_id INTEGER PRIMARY KEY,
             is_enabled INTEGER DEFAULT 1,
             default_threshold INTEGER DEFAULT 10,
-            update_interval INTEGER DEFAULT 30
+            update_interval INTEGER DEFAULT 30,
+            default_min_authors INTEGER DEFAULT NULL,
+            burst_threshold INTEGER DEFAULT NULL
         )
         """)
 
@@ -36,26 +76,149 @@ class Database:
             guild_id INTEGER NOT NULL,
             is_enabled INTEGER DEFAULT 1,
             threshold INTEGER DEFAULT NULL,
+            min_authors INTEGER DEFAULT NULL,
             FOREIGN KEY (guild_id) REFERENCES guild_config(guild_id)
         )
         """)
 
+        # One row per channel-hour; `counts` holds 60 little-endian uint16
+        # per-minute message counters.
         await self.connection.execute("""
-        CREATE TABLE IF NOT EXISTS message_activity (
+        CREATE TABLE IF NOT EXISTS activity_hours (
             channel_id INTEGER NOT NULL,
-            timestamp INTEGER NOT NULL,
-            message_count INTEGER DEFAULT 1,
-            PRIMARY KEY (channel_id, timestamp),
-            FOREIGN KEY (channel_id) REFERENCES channel_config(channel_id)
-        )
+            hour INTEGER NOT NULL,
+            counts BLOB NOT NULL,
+            PRIMARY KEY (channel_id, hour)
+        ) WITHOUT ROWID
         """)
 
+        await self.connection.execute("""
+        CREATE TABLE IF NOT EXISTS author_sketches (
+            channel_id INTEGER NOT NULL,
+            minute INTEGER NOT NULL,
+            sketch BLOB NOT NULL,
+            PRIMARY KEY (channel_id, minute)
+        ) WITHOUT ROWID
+        """)
+
+        await self._ensure_column(
+            "guild_config", "default_min_authors", "INTEGER DEFAULT NULL"
+        )
+        await self._ensure_column(
+            "guild_config", "burst_threshold", "INTEGER DEFAULT NULL"
+        )
+        await self._ensure_column(
+            "channel_config", "min_authors", "INTEGER DEFAULT NULL"
+        )
+
         await self.connection.commit()
+        await self._migrate()
         logger.info("Database initialized successfully")
 
+    async def init_read_only(self) -> None:
+        """Open an existing database for reading, without creating or migrating.
+
+        Safe to use while the bot has the same file open.
+        """
+        uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+        self.connection = await aiosqlite.connect(uri, uri=True)
+        self.connection.row_factory = aiosqlite.Row
+
+        async with self.connection.execute("PRAGMA user_version") as cursor:
+            version = (await cursor.fetchone())[0]
+
+        if version < SCHEMA_VERSION or not await self._get_columns("activity_hours"):
+            await self.connection.close()
+            raise RuntimeError(
+                "database uses an older schema; start the bot once to migrate it"
+            )
+
+    async def _get_columns(self, table: str) -> List[str]:
+        async with self.connection.execute(f"PRAGMA table_info({table})") as cursor:
+            return [row["name"] for row in await cursor.fetchall()]
+
+    async def _ensure_column(self, table: str, column: str, definition: str) -> None:
+        """Add a column to tables created before it existed."""
+        if column not in await self._get_columns(table):
+            await self.connection.execute(
+                f"ALTER TABLE {table} ADD COLUMN {column} {definition}"
+            )
+            logger.info(f"Added column {column} to {table}")
+
+    async def _migrate(self) -> None:
+        async with self.connection.execute("PRAGMA user_version") as cursor:
+            version = (await cursor.fetchone())[0]
+
+        if version >= SCHEMA_VERSION:
+            return
+
+        columns = await self._get_columns("message_activity")
+        if columns:
+            await self._migrate_message_activity("author_sketch" in columns)
+
+        await self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        await self.connection.commit()
+
+        if columns:
+            # Dropping the old table only frees pages, give them back to the OS.
+            await self.connection.execute("VACUUM")
+
+    async def _migrate_message_activity(self, has_sketches: bool) -> None:
+        """Move per-minute message_activity rows into packed channel-hour rows."""
+        rows = 0
+        key = None
+        counts = array("H", bytes(2 * MINUTES_PER_HOUR))
+        batch = []
+
+        async with self.connection.execute(
+            """
+            SELECT channel_id, timestamp, message_count FROM message_activity
+            WHERE message_count > 0
+            ORDER BY channel_id, timestamp
+            """
+        ) as cursor:
+            async for row in cursor:
+                hour = row["timestamp"] - row["timestamp"] % 3600
+                if (row["channel_id"], hour) != key:
+                    if key is not None:
+                        batch.append((*key, pack_counts(counts)))
+                    key = (row["channel_id"], hour)
+                    counts = array("H", bytes(2 * MINUTES_PER_HOUR))
+
+                minute = (row["timestamp"] - hour) // 60
+                counts[minute] = min(
+                    counts[minute] + row["message_count"], MAX_MINUTE_COUNT
+                )
+                rows += 1
+
+        if key is not None:
+            batch.append((*key, pack_counts(counts)))
+
+        await self.connection.executemany(
+            "INSERT OR REPLACE INTO activity_hours (channel_id, hour, counts) VALUES (?, ?, ?)",
+            batch,
+        )
+
+        if has_sketches:
+            await self.connection.execute(
+                """
+                INSERT OR REPLACE INTO author_sketches (channel_id, minute, sketch)
+                SELECT channel_id, timestamp, author_sketch FROM message_activity
+                WHERE author_sketch IS NOT NULL
+                """
+            )
+
+        await self.connection.execute("DROP TABLE message_activity")
+        await self.connection.commit()
+
+        logger.info(
+            f"Migrated {rows} message_activity rows into {len(batch)} activity_hours rows"
+        )
+
     async def close(self) -> None:
         """Close the database connection."""
         if self.connection:
+            await self.flush_activity()
             await self.connection.close()
             logger.info("Database connection closed")
 
@@ -76,6 +239,8 @@ class Database:
                     "is_enabled": 1,
                     "default_threshold": 10,
                     "update_interval": 30,
+                    "default_min_authors": None,
+                    "burst_threshold": None,
                 }
 
     async def update_guild_config(self, guild_id: int, **kwargs) -> None:
@@ -107,6 +272,7 @@ class Database:
                     "guild_id": guild_id,
                     "is_enabled": 1,
                     "threshold": None,
+                    "min_authors": None,
                 }
 
     async def update_channel_config(self, channel_id: int, **kwargs) -> None:
@@ -127,40 +293,212 @@ class Database:
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
 
-    async def record_message(self, channel_id: int, timestamp: int) -> None:
-        rounded_timestamp = (timestamp // 60) * 60
+    def record_message(self, channel_id: int, timestamp: int, count: int = 1) -> None:
+        """Buffer a message; it is written by the next `flush_activity`."""
+        hour = timestamp - timestamp % 3600
 
-        await self.connection.execute(
+        counts = self._pending.get((channel_id, hour))
+        if counts is None:
+            counts = self._pending[(channel_id, hour)] = array(
+                "H", bytes(2 * MINUTES_PER_HOUR)
+            )
+
+        minute = (timestamp - hour) // 60
+        counts[minute] = min(counts[minute] + count, MAX_MINUTE_COUNT)
+
+    async def flush_activity(self) -> int:
+        """Merge buffered increments into activity_hours, returning rows written."""
+        async with self._activity_lock:
+            if not self._pending:
+                return 0
+
+            pending, self._pending = self._pending, {}
+
+            try:
+                merged = await self._merge_activity(pending)
+            except Exception:
+                # Keep the increments for the next flush rather than losing them.
+                for key, counts in pending.items():
+                    buffered = self._pending.get(key)
+                    self._pending[key] = (
+                        counts if buffered is None else _add_counts(buffered, counts)
+                    )
+                raise
+
+            return merged
+
+    async def _merge_activity(self, pending: Dict[Tuple[int, int], array]) -> int:
+        keys = list(pending)
+        stored: Dict[Tuple[int, int], bytes] = {}
+
+        for offset in range(0, len(keys), FLUSH_BATCH_SIZE):
+            batch = keys[offset : offset + FLUSH_BATCH_SIZE]
+            placeholders = ", ".join("(?, ?)" for _ in batch)
+            async with self.connection.execute(
+                f"""
+                SELECT channel_id, hour, counts FROM activity_hours
+                WHERE (channel_id, hour) IN (VALUES {placeholders})
+                """,
+                [value for key in batch for value in key],
+            ) as cursor:
+                for row in await cursor.fetchall():
+                    stored[(row["channel_id"], row["hour"])] = row["counts"]
+
+        merged = []
+        for key, counts in pending.items():
+            if key in stored:
+                counts = _add_counts(unpack_counts(stored[key]), counts)
+            merged.append((*key, pack_counts(counts)))
+
+        await self.connection.executemany(
             """
-            INSERT INTO message_activity (channel_id, timestamp, message_count)
-            VALUES (?, ?, 1)
-            ON CONFLICT (channel_id, timestamp) DO UPDATE SET
-            message_count = message_count + 1
+            INSERT INTO activity_hours (channel_id, hour, counts) VALUES (?, ?, ?)
+            ON CONFLICT (channel_id, hour) DO UPDATE SET counts = excluded.counts
             """,
-            (channel_id, rounded_timestamp),
+            merged,
         )
         await self.connection.commit()
+        return len(merged)
+
+    def _pending_since(
+        self, channel_ids: Iterable[int], start_time: int
+    ) -> Dict[int, int]:
+        channel_ids = set(channel_ids)
+        totals: Dict[int, int] = {}
+        for (channel_id, hour), counts in self._pending.items():
+            if channel_id in channel_ids and hour + 3600 > start_time:
+                totals[channel_id] = totals.get(channel_id, 0) + _sum_since(
+                    counts, hour, start_time
+                )
+        return totals
+
+    async def save_author_sketches(
+        self, sketches: List[Tuple[int, int, bytes]]
+    ) -> None:
+        """Persist `(channel_id, minute, sketch)` rows, merging with stored sketches."""
+        if not sketches:
+            return
+
+        merged = []
+        for channel_id, minute, data in sketches:
+            sketch = HyperLogLog.from_bytes(data)
+            async with self.connection.execute(
+                "SELECT sketch FROM author_sketches WHERE channel_id = ? AND minute = ?",
+                (channel_id, minute),
+            ) as cursor:
+                row = await cursor.fetchone()
 
-    async def get_channel_activity(self, channel_id: int, time_window: int) -> int:
-        import time
-
-        current_time = int(time.time())
-        start_time = current_time - time_window
+            if row:
+                sketch.merge(HyperLogLog.from_bytes(row["sketch"]))
+            merged.append((channel_id, minute, sketch.to_bytes()))
 
-        async with self.connection.execute(
+        await self.connection.executemany(
             """
-            SELECT SUM(message_count) as total_messages
-            FROM message_activity
-            WHERE channel_id = ? AND timestamp >= ?
+            INSERT INTO author_sketches (channel_id, minute, sketch) VALUES (?, ?, ?)
+            ON CONFLICT (channel_id, minute) DO UPDATE SET sketch = excluded.sketch
             """,
+            merged,
+        )
+        await self.connection.commit()
+
+    async def get_author_sketch(self, channel_id: int, time_window: int) -> HyperLogLog:
+        start_time = int(time.time()) - time_window
+
+        async with self.connection.execute(
+            "SELECT sketch FROM author_sketches WHERE channel_id = ? AND minute >= ?",
             (channel_id, start_time),
         ) as cursor:
-            row = await cursor.fetchone()
-            return (
-                row["total_messages"]
-                if row and row["total_messages"] is not None
-                else 0
+            rows = await cursor.fetchall()
+
+        return HyperLogLog.union(HyperLogLog.from_bytes(row["sketch"]) for row in rows)
+
+    async def get_channel_activity(self, channel_id: int, time_window: int) -> int:
+        activity = await self.get_channels_activity([channel_id], time_window)
+        return activity[channel_id]
+
+    async def get_channels_activity(
+        self, channel_ids: List[int], time_window: int
+    ) -> Dict[int, int]:
+        if not channel_ids:
+            return {}
+
+        start_time = int(time.time()) - time_window
+        placeholders = ", ".join("?" for _ in channel_ids)
+
+        async with self._activity_lock:
+            async with self.connection.execute(
+                f"""
+                SELECT channel_id, hour, counts
+                FROM activity_hours
+                WHERE channel_id IN ({placeholders}) AND hour > ?
+                """,
+                (*channel_ids, start_time - 3600),
+            ) as cursor:
+                rows = await cursor.fetchall()
+
+            pending = self._pending_since(channel_ids, start_time)
+
+        activity = {channel_id: 0 for channel_id in channel_ids}
+        for row in rows:
+            activity[row["channel_id"]] += _sum_since(
+                unpack_counts(row["counts"]), row["hour"], start_time
             )
+        for channel_id, count in pending.items():
+            activity[channel_id] += count
+        return activity
+
+    async def iter_activity(
+        self,
+        channel_id: Optional[int] = None,
+        guild_id: Optional[int] = None,
+        since: int = 0,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[Tuple[int, int, int]]:
+        """Yield non-zero `(channel_id, timestamp, message_count)` minutes in key order.
+
+        Hour rows are read in pages of `batch_size` using keyset pagination, so
+        memory stays bounded however large the table is.
+        """
+        await self.flush_activity()
+
+        conditions = ["(a.channel_id, a.hour) > (?, ?)", "a.hour > ?"]
+        filters: list = [since - 3600]
+
+        if channel_id is not None:
+            conditions.append("a.channel_id = ?")
+            filters.append(channel_id)
+
+        if guild_id is not None:
+            conditions.append(
+                "a.channel_id IN (SELECT channel_id FROM channel_config WHERE guild_id = ?)"
+            )
+            filters.append(guild_id)
+
+        query = f"""
+            SELECT a.channel_id, a.hour, a.counts
+            FROM activity_hours a
+            WHERE {" AND ".join(conditions)}
+            ORDER BY a.channel_id, a.hour
+            LIMIT ?
+        """
+
+        last_key = (-1, -1)
+        while True:
+            async with self.connection.execute(
+                query, (*last_key, *filters, batch_size)
+            ) as cursor:
+                rows = await cursor.fetchall()
+
+            for row in rows:
+                for minute, count in enumerate(unpack_counts(row["counts"])):
+                    timestamp = row["hour"] + minute * 60
+                    if count and timestamp >= since:
+                        yield row["channel_id"], timestamp, count
+
+            if len(rows) < batch_size:
+                break
+
+            last_key = (rows[-1]["channel_id"], rows[-1]["hour"])
 
     async def get_enabled_guilds(self) -> List[dict]:
         async with self.connection.execute(
@@ -175,18 +513,139 @@ class Database:
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
 
-    async def cleanup_old_messages(self, max_age: int = 86400) -> None:
-        import time
+    async def get_burst_thresholds(self) -> Dict[int, int]:
+        async with self.connection.execute(
+            """
+            SELECT guild_id, burst_threshold FROM guild_config
+            WHERE burst_threshold IS NOT NULL
+            """
+        ) as cursor:
+            rows = await cursor.fetchall()
+            return {row["guild_id"]: row["burst_threshold"] for row in rows}
+
+    async def get_enabled_channel_ids(self, channel_ids: List[int]) -> List[int]:
+        if not channel_ids:
+            return []
+
+        placeholders = ", ".join("?" for _ in channel_ids)
+        async with self.connection.execute(
+            f"""
+            SELECT channel_id FROM channel_config
+            WHERE channel_id IN ({placeholders}) AND is_enabled = 1
+            """,
+            channel_ids,
+        ) as cursor:
+            rows = await cursor.fetchall()
+            return [row["channel_id"] for row in rows]
+
+    async def get_guild_ids(self) -> List[int]:
+        async with self.connection.execute(
+            """
+            SELECT guild_id FROM guild_config
+            UNION
+            SELECT guild_id FROM channel_config
+            """
+        ) as cursor:
+            rows = await cursor.fetchall()
+            return [row["guild_id"] for row in rows]
 
+    async def get_channel_ids(self, guild_id: int) -> List[int]:
+        async with self.connection.execute(
+            "SELECT channel_id FROM channel_config WHERE guild_id = ?", (guild_id,)
+        ) as cursor:
+            rows = await cursor.fetchall()
+            return [row["channel_id"] for row in rows]
+
+    async def purge_guilds(self, guild_ids: List[int]) -> List[int]:
+        """Delete all config and activity for the guilds, returning their channel IDs."""
+        if not guild_ids:
+            return []
+
+        placeholders = ", ".join("?" for _ in guild_ids)
+        async with self.connection.execute(
+            f"SELECT channel_id FROM channel_config WHERE guild_id IN ({placeholders})",
+            guild_ids,
+        ) as cursor:
+            channel_ids = [row["channel_id"] for row in await cursor.fetchall()]
+
+        params = [(guild_id,) for guild_id in guild_ids]
+        async with self._activity_lock:
+            self._discard_pending(channel_ids)
+
+            for table in ("activity_hours", "author_sketches"):
+                await self.connection.executemany(
+                    f"""
+                    DELETE FROM {table} WHERE channel_id IN (
+                        SELECT channel_id FROM channel_config WHERE guild_id = ?
+                    )
+                    """,
+                    params,
+                )
+            await self.connection.executemany(
+                "DELETE FROM channel_config WHERE guild_id = ?", params
+            )
+            await self.connection.executemany(
+                "DELETE FROM guild_config WHERE guild_id = ?", params
+            )
+            await self.connection.commit()
+        return channel_ids
+
+    async def purge_channels(self, channel_ids: List[int]) -> None:
+        if not channel_ids:
+            return
+
+        params = [(channel_id,) for channel_id in channel_ids]
+        async with self._activity_lock:
+            self._discard_pending(channel_ids)
+
+            for table in ("activity_hours", "author_sketches"):
+                await self.connection.executemany(
+                    f"DELETE FROM {table} WHERE channel_id = ?", params
+                )
+            await self.connection.executemany(
+                "DELETE FROM channel_config WHERE channel_id = ?", params
+            )
+            await self.connection.commit()
+
+    async def disable_channels(self, channel_ids: List[int]) -> None:
+        if not channel_ids:
+            return
+
+        await self.connection.executemany(
+            "UPDATE channel_config SET is_enabled = 0 WHERE channel_id = ?",
+            [(channel_id,) for channel_id in channel_ids],
+        )
+        await self.connection.commit()
+
+    def _discard_pending(self, channel_ids: List[int]) -> None:
+        channel_ids = set(channel_ids)
+        for key in [key for key in self._pending if key[0] in channel_ids]:
+            del self._pending[key]
+
+    async def cleanup_old_messages(self, max_age: int = 86400) -> None:
         current_time = int(time.time())
         cutoff_time = current_time - max_age
 
+        # Hour rows are dropped once every minute in them is past the cutoff.
+        await self.connection.execute(
+            "DELETE FROM activity_hours WHERE hour + 3600 <= ?", (cutoff_time,)
+        )
         await self.connection.execute(
-            "DELETE FROM message_activity WHERE timestamp < ?", (cutoff_time,)
+            "DELETE FROM author_sketches WHERE minute < ?", (cutoff_time,)
         )
         await self.connection.commit()
 
 
+def _add_counts(left: array, right: array) -> array:
+    return array("H", (min(a + b, MAX_MINUTE_COUNT) for a, b in zip(left, right)))
+
+
+def _sum_since(counts: array, hour: int, start_time: int) -> int:
+    """Sum the minutes of an hour row that start at or after `start_time`."""
+    first = max(0, -((hour - start_time) // 60))
+    return sum(counts[first:])
+
+
 db = Database()
 
 
@@ -0,0 +1,209 @@
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Sequence
+
+import arc
+
+logger = logging.getLogger("forecast")
+
+# Level and trend below this, in messages per bucket, are treated as zero.
+NEGLIGIBLE = 1e-6
+
+
+class HoltForecaster:
+    """Holt linear (double exponential) smoothing over fixed-size buckets.
+
+    Counts for the current bucket accumulate until a later bucket starts,
+    at which point the finished bucket is folded into the level and trend.
+    Empty buckets are folded one at a time only until level and trend have
+    decayed to nothing, after which the rest of a gap only decays the error,
+    and gaps longer than `max_gap` simply reset the state.
+    """
+
+    __slots__ = (
+        "bucket_seconds",
+        "alpha",
+        "beta",
+        "max_gap",
+        "level",
+        "trend",
+        "error",
+        "bucket",
+        "count",
+    )
+
+    def __init__(
+        self,
+        bucket_seconds: int = 1,
+        alpha: float = 0.1,
+        beta: float = 0.02,
+        max_gap: int = 300,
+    ):
+        self.bucket_seconds = bucket_seconds
+        self.alpha = alpha
+        self.beta = beta
+        self.max_gap = max_gap
+
+        self.level = 0.0
+        self.trend = 0.0
+        # Smoothed absolute one-step-ahead error, in messages per bucket.
+        self.error = 0.0
+        self.bucket: Optional[int] = None
+        self.count = 0.0
+
+    def _fold(self, value: float) -> None:
+        forecast = self.level + self.trend
+        self.error += self.alpha * (abs(value - forecast) - self.error)
+
+        level = self.alpha * value + (1 - self.alpha) * forecast
+        self.trend = self.beta * (level - self.level) + (1 - self.beta) * self.trend
+        self.level = level
+
+    def _fold_empty(self, buckets: int) -> None:
+        """Fold `buckets` zero-count buckets."""
+        # The forecast changes sign as a falling trend overshoots zero, and
+        # |forecast| feeds the error, so these folds aren't linear; step them.
+        while buckets > 0 and (
+            abs(self.level) > NEGLIGIBLE or abs(self.trend) > NEGLIGIBLE
+        ):
+            self._fold(0.0)
+            buckets -= 1
+
+        if buckets > 0:
+            self.level = self.trend = 0.0
+            self.error *= (1 - self.alpha) ** buckets
+
+    def advance(self, timestamp: float) -> None:
+        """Fold every bucket that finished before `timestamp`."""
+        bucket = int(timestamp // self.bucket_seconds)
+        if self.bucket is None:
+            self.bucket = bucket
+            return
+        if bucket <= self.bucket:
+            return
+
+        self._fold(self.count)
+        gap = bucket - self.bucket - 1
+        if gap > self.max_gap:
+            self.level = self.trend = 0.0
+        else:
+            self._fold_empty(gap)
+
+        self.bucket = bucket
+        self.count = 0.0
+
+    def add(self, timestamp: float, weight: float = 1) -> None:
+        # A message older than the current bucket can't be folded any more
+        # and is counted in the current one instead.
+        self.advance(timestamp)
+        self.count += weight
+
+    def forecast(self, steps: float) -> float:
+        """Messages per bucket expected `steps` buckets ahead."""
+        return max(0.0, self.level + self.trend * steps)
+
+    def projected_rate(self, horizon: float, margin: float = 0.0) -> float:
+        """Projected messages per minute `horizon` seconds ahead.
+
+        `margin` smoothed one-step errors are subtracted, so noise alone
+        doesn't project a quiet channel over its threshold.
+        """
+        forecast = self.forecast(horizon / self.bucket_seconds)
+        return max(0.0, forecast - margin * self.error) * 60 / self.bucket_seconds
+
+    @property
+    def error_rate(self) -> float:
+        """Smoothed one-step-ahead error in messages per minute."""
+        return self.error * 60 / self.bucket_seconds
+
+
+class ForecastTracker:
+    """One forecaster per tracked channel, updated as messages arrive."""
+
+    def __init__(
+        self,
+        horizon: Optional[float] = None,
+        bucket_seconds: Optional[int] = None,
+        alpha: Optional[float] = None,
+        beta: Optional[float] = None,
+        margin: Optional[float] = None,
+    ):
+        self.horizon = (
+            horizon
+            if horizon is not None
+            else float(os.environ.get("FORECAST_HORIZON", 30))
+        )
+        self.bucket_seconds = bucket_seconds or int(
+            os.environ.get("FORECAST_BUCKET", 10)
+        )
+        self.alpha = alpha or float(os.environ.get("FORECAST_ALPHA", 0.3))
+        self.beta = beta or float(os.environ.get("FORECAST_BETA", 0.1))
+        self.margin = (
+            margin
+            if margin is not None
+            else float(os.environ.get("FORECAST_MARGIN", 0.5))
+        )
+
+        self._channels: Dict[int, HoltForecaster] = {}
+
+    def record(self, channel_id: int, timestamp: float, weight: float = 1) -> None:
+        forecaster = self._channels.get(channel_id)
+        if forecaster is None:
+            forecaster = self._channels[channel_id] = HoltForecaster(
+                bucket_seconds=self.bucket_seconds, alpha=self.alpha, beta=self.beta
+            )
+        forecaster.add(timestamp, weight)
+
+    def get(self, channel_id: int) -> Optional[HoltForecaster]:
+        forecaster = self._channels.get(channel_id)
+        if forecaster is not None:
+            forecaster.advance(time.time())
+        return forecaster
+
+    def projected_rates(self, channel_ids: Sequence[int]) -> List[float]:
+        if self.horizon <= 0:
+            return [0.0] * len(channel_ids)
+
+        now = time.time()
+        rates = []
+        for channel_id in channel_ids:
+            forecaster = self._channels.get(channel_id)
+            if forecaster is None:
+                rates.append(0.0)
+                continue
+
+            forecaster.advance(now)
+            rates.append(self.project(forecaster))
+        return rates
+
+    def project(self, forecaster: HoltForecaster) -> float:
+        """The rate the control loop acts on, 0 unless the channel is rising."""
+        # A decaying burst should fall back to the measured rate rather than
+        # keep slowmode raised.
+        if self.horizon <= 0 or forecaster.trend <= 0:
+            return 0.0
+        return forecaster.projected_rate(self.horizon, self.margin)
+
+    def expire(self, max_idle: int = 900) -> None:
+        cutoff = time.time() - max_idle
+        for channel_id, forecaster in list(self._channels.items()):
+            last_seen = (forecaster.bucket or 0) * forecaster.bucket_seconds
+            if last_seen < cutoff:
+                del self._channels[channel_id]
+
+    def forget(self, channel_id: int) -> None:
+        self._channels.pop(channel_id, None)
+
+
+forecast_tracker = ForecastTracker()
+
+
+@arc.loader
+def load(client: arc.GatewayClient) -> None:
+    client.set_type_dependency(ForecastTracker, forecast_tracker)
+
+
+@arc.unloader
+def unload(client: arc.GatewayClient) -> None:
+    pass
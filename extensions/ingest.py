@@ -0,0 +1,99 @@
+import collections
+import logging
+import os
+from typing import Deque, Dict, Optional, Set, Tuple
+
+import arc
+
+logger = logging.getLogger("ingest")
+
+
+class EventClock:
+    """Event-time watermark and duplicate filter for incoming messages.
+
+    In-memory windows are keyed by each message's own timestamp, so a
+    gateway replay lands in the seconds the messages were actually sent.
+    Each shard's watermark trails the newest event time seen on that shard
+    by `allowed_lateness`; messages older than it are late and kept out of
+    the in-memory windows. Shards resume independently, so one shard's
+    replay is never judged against another shard's live traffic.
+    The last `dedup_size` message IDs are remembered to drop redeliveries.
+    """
+
+    def __init__(
+        self,
+        allowed_lateness: Optional[float] = None,
+        dedup_size: Optional[int] = None,
+    ):
+        self.allowed_lateness = (
+            allowed_lateness
+            if allowed_lateness is not None
+            else float(os.environ.get("EVENT_LATENESS", 10))
+        )
+        self.dedup_size = dedup_size or int(os.environ.get("DEDUP_SIZE", 8192))
+
+        self.max_event_time: Dict[int, float] = {}
+        self.late = 0
+        self.duplicates = 0
+        self.skewed = 0
+
+        self._recent: Deque[int] = collections.deque()
+        self._seen: Set[int] = set()
+        self._reported: Tuple[int, int] = (0, 0)
+
+    def watermark(self, shard_id: int = 0) -> float:
+        return self.max_event_time.get(shard_id, 0.0) - self.allowed_lateness
+
+    def is_duplicate(self, message_id: int) -> bool:
+        """Remember the message ID, returning True if it was already seen."""
+        if message_id in self._seen:
+            self.duplicates += 1
+            return True
+
+        if len(self._recent) >= self.dedup_size:
+            self._seen.discard(self._recent.popleft())
+        self._recent.append(message_id)
+        self._seen.add(message_id)
+        return False
+
+    def observe(
+        self, event_time: float, received: float, shard_id: int = 0
+    ) -> Optional[float]:
+        """Return the event time to window a message at, or None if it is late."""
+        if event_time > received:
+            # Discord's clock is ahead of ours; don't create future buckets.
+            self.skewed += 1
+            event_time = received
+
+        if event_time < self.watermark(shard_id):
+            self.late += 1
+            return None
+
+        if event_time > self.max_event_time.get(shard_id, 0.0):
+            self.max_event_time[shard_id] = event_time
+        return event_time
+
+    def take_recent(self) -> Tuple[int, int]:
+        """Late and duplicate messages since the previous call."""
+        late, duplicates = self._reported
+        self._reported = (self.late, self.duplicates)
+        return self.late - late, self.duplicates - duplicates
+
+    def summary(self) -> str:
+        return (
+            f"late={self.late} duplicates={self.duplicates} skewed={self.skewed} "
+            f"lateness={self.allowed_lateness:.0f}s dedup={len(self._seen)}/{self.dedup_size}"
+        )
+
+
+event_clock = EventClock()
+
+
+@arc.loader
+def load(client: arc.GatewayClient) -> None:
+    client.set_type_dependency(EventClock, event_clock)
+
+
+@arc.unloader
+def unload(client: arc.GatewayClient) -> None:
+    pass
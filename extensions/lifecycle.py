@@ -0,0 +1,199 @@
+import asyncio
+import logging
+from typing import Iterable, List
+
+import arc
+import hikari
+
+from .authors import AuthorTracker
+from .bursts import BurstDetector
+from .db import Database
+from .forecast import ForecastTracker
+from .permissions import PermissionCache
+from .ratelimit import EditBudget
+from .utils import message_cache
+
+logger = logging.getLogger("lifecycle")
+
+plugin = arc.GatewayPlugin("lifecycle")
+
+# Set once the database is up and the startup pass has taken over every guild
+# already in the cache. GUILD_CREATE for most guilds arrives before that.
+startup_reconciled = asyncio.Event()
+
+
+def forget_channels(client: arc.GatewayClient, channel_ids: Iterable[int]) -> None:
+    """Drop a channel from every in-memory index."""
+    edit_budget = client.get_type_dependency(EditBudget)
+    author_tracker = client.get_type_dependency(AuthorTracker)
+    permissions = client.get_type_dependency(PermissionCache)
+    forecasts = client.get_type_dependency(ForecastTracker)
+
+    for channel_id in channel_ids:
+        message_cache.pop(channel_id, None)
+        edit_budget.forget(channel_id)
+        author_tracker.forget(channel_id)
+        forecasts.forget(channel_id)
+        permissions.forget(channel_id)
+
+
+async def purge_guilds(client: arc.GatewayClient, guild_ids: List[int]) -> None:
+    database = client.get_type_dependency(Database)
+    bursts = client.get_type_dependency(BurstDetector)
+
+    channel_ids = await database.purge_guilds(guild_ids)
+    forget_channels(client, channel_ids)
+    for guild_id in guild_ids:
+        bursts.forget(guild_id)
+
+    logger.info(
+        f"Purged {len(guild_ids)} guilds and {len(channel_ids)} channels from auto-slowmode"
+    )
+
+
+async def reconcile_channels(
+    client: arc.GatewayClient,
+    guild_id: int,
+    channels: Iterable[hikari.GuildChannel],
+) -> None:
+    """Purge deleted channels and disable ones that can no longer have slowmode."""
+    database = client.get_type_dependency(Database)
+
+    current = {channel.id: channel for channel in channels}
+    missing = []
+    unsupported = []
+
+    for channel_id in await database.get_channel_ids(guild_id):
+        channel = current.get(channel_id)
+        if channel is None:
+            missing.append(channel_id)
+        elif not isinstance(channel, hikari.GuildTextChannel):
+            unsupported.append(channel_id)
+
+    await database.purge_channels(missing)
+    await database.disable_channels(unsupported)
+    forget_channels(client, missing + unsupported)
+
+    if missing or unsupported:
+        logger.info(
+            f"Reconciled guild {guild_id}: purged {len(missing)} deleted channels, "
+            f"disabled {len(unsupported)} unsupported channels"
+        )
+
+
+@plugin.listen()
+async def on_guild_leave(event: hikari.GuildLeaveEvent) -> None:
+    await purge_guilds(plugin.client, [event.guild_id])
+
+
+@plugin.listen(hikari.GuildChannelDeleteEvent, hikari.GuildThreadDeleteEvent)
+async def on_channel_delete(
+    event: hikari.GuildChannelDeleteEvent | hikari.GuildThreadDeleteEvent,
+) -> None:
+    database = plugin.client.get_type_dependency(Database)
+
+    channel_id = (
+        event.channel_id
+        if isinstance(event, hikari.GuildChannelDeleteEvent)
+        else event.thread_id
+    )
+
+    await database.purge_channels([channel_id])
+    forget_channels(plugin.client, [channel_id])
+    logger.info(f"Channel {channel_id} was deleted, removed it from auto-slowmode")
+
+
+@plugin.listen()
+async def on_channel_update(event: hikari.GuildChannelUpdateEvent) -> None:
+    if isinstance(event.channel, hikari.GuildTextChannel):
+        return
+
+    if event.old_channel is not None and not isinstance(
+        event.old_channel, hikari.GuildTextChannel
+    ):
+        return
+
+    database = plugin.client.get_type_dependency(Database)
+
+    # Only channels we track have a config row; disabling is a no-op otherwise.
+    await database.disable_channels([event.channel_id])
+    forget_channels(plugin.client, [event.channel_id])
+    logger.debug(
+        "Channel %s changed to type %s, disabled it in auto-slowmode",
+        event.channel_id,
+        event.channel.type,
+    )
+
+
+async def reconcile_cached_guilds(client: arc.GatewayClient) -> None:
+    """Reconcile every guild in the cache against its cached channels."""
+    cache = client.app.cache
+
+    for guild_id in list(cache.get_available_guilds_view()):
+        try:
+            await reconcile_channels(
+                client,
+                guild_id,
+                [
+                    *cache.get_guild_channels_view_for_guild(guild_id).values(),
+                    *cache.get_threads_view_for_guild(guild_id).values(),
+                ],
+            )
+        except Exception as e:
+            logger.error(f"Error reconciling channels for guild {guild_id}: {str(e)}")
+
+
+@plugin.listen()
+async def on_guild_available(event: hikari.GuildAvailableEvent) -> None:
+    # Guilds available before startup are reconciled from the cache once the
+    # database is ready; this handles ones that arrive or recover afterwards.
+    if not startup_reconciled.is_set():
+        return
+
+    try:
+        await reconcile_channels(
+            plugin.client,
+            event.guild_id,
+            [*event.channels.values(), *event.threads.values()],
+        )
+    except Exception as e:
+        logger.error(f"Error reconciling channels for guild {event.guild_id}: {str(e)}")
+
+
+@arc.utils.interval_loop(hours=6)
+async def reconcile_guilds(client: arc.GatewayClient, database: Database) -> None:
+    """Purge guilds the bot was removed from while it wasn't listening."""
+    try:
+        joined = {guild.id async for guild in client.app.rest.fetch_my_guilds()}
+        stored = await database.get_guild_ids()
+
+        left = [guild_id for guild_id in stored if guild_id not in joined]
+        if left:
+            await purge_guilds(client, left)
+    except Exception as e:
+        logger.error(f"Error reconciling guilds: {str(e)}")
+
+
+@plugin.listen()
+async def on_started(_: hikari.StartedEvent) -> None:
+    await asyncio.sleep(1)
+
+    database = plugin.client.get_type_dependency(Database)
+
+    # The cache is snapshotted before the first await, so no guild can slip
+    # between this pass and on_guild_available.
+    startup_reconciled.set()
+    await reconcile_cached_guilds(plugin.client)
+
+    reconcile_guilds.start(client=plugin.client, database=database)
+
+
+@arc.loader
+def loader(client: arc.GatewayClient) -> None:
+    client.add_plugin(plugin)
+
+
+@arc.unloader
+def unloader(client: arc.GatewayClient) -> None:
+    reconcile_guilds.stop()
+    client.remove_plugin(plugin)
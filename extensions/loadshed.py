@@ -0,0 +1,178 @@
+import asyncio
+import enum
+import logging
+import os
+import time
+from typing import Optional, Sequence
+
+import arc
+import hikari
+
+logger = logging.getLogger("loadshed")
+
+plugin = arc.GatewayPlugin("loadshed")
+
+
+class LoadLevel(enum.IntEnum):
+    NORMAL = 0
+    # Only every Nth message is ingested, weighted by N.
+    SAMPLING = 1
+    # Messages are only kept in in-memory windows, not persisted.
+    MEMORY_ONLY = 2
+    # Cleanup, sketch persistence and notifications are paused.
+    ESSENTIAL = 3
+    # Channels are handled busiest-first and slowmode is never lowered.
+    PRIORITY = 4
+
+
+DEFAULT_LAG_LEVELS = "0.05,0.1,0.25,0.5"
+
+
+class LoadMonitor:
+    """Samples event loop scheduling delay and maps it to a degradation level.
+
+    Levels rise as soon as the smoothed lag crosses their threshold and only
+    fall after the lag has stayed below it for `cooldown` seconds.
+    """
+
+    def __init__(
+        self,
+        lag_levels: Optional[Sequence[float]] = None,
+        interval: float = 0.25,
+        cooldown: float = 10.0,
+        sample_every: Optional[int] = None,
+    ):
+        self.lag_levels = list(
+            lag_levels
+            or [
+                float(level)
+                for level in os.environ.get(
+                    "LOAD_SHED_LEVELS", DEFAULT_LAG_LEVELS
+                ).split(",")
+            ]
+        )
+        self.interval = interval
+        self.cooldown = cooldown
+        self.sample_every = sample_every or int(
+            os.environ.get("LOAD_SHED_SAMPLE_EVERY", 4)
+        )
+
+        self.level = LoadLevel.NORMAL
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.sampled_out = 0
+        self.unpersisted = 0
+
+        self._calm_since: Optional[float] = None
+        self._counter = 0
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.observe(max(0.0, loop.time() - expected))
+
+    def observe(self, lag: float) -> None:
+        self.lag = 0.7 * self.lag + 0.3 * lag
+        self.max_lag = max(self.max_lag, lag)
+
+        exceeded = sum(1 for threshold in self.lag_levels if self.lag >= threshold)
+        target = LoadLevel(min(exceeded, LoadLevel.PRIORITY))
+        now = time.monotonic()
+
+        if target > self.level:
+            self._set_level(target)
+            self._calm_since = None
+        elif target < self.level:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= self.cooldown:
+                self._set_level(LoadLevel(self.level - 1))
+                self._calm_since = now
+        else:
+            self._calm_since = None
+
+    def _set_level(self, level: LoadLevel) -> None:
+        previous = self.level
+        self.level = level
+
+        if level > previous:
+            logger.warning(
+                "Event loop lag %.0fms, degrading from %s to %s",
+                self.lag * 1000,
+                previous.name,
+                level.name,
+            )
+        else:
+            logger.info(
+                "Event loop lag %.0fms, recovering from %s to %s",
+                self.lag * 1000,
+                previous.name,
+                level.name,
+            )
+
+    def admit(self) -> int:
+        """Return the weight to ingest the next message with, or 0 to drop it."""
+        if self.level < LoadLevel.SAMPLING:
+            return 1
+
+        self._counter += 1
+        if self._counter % self.sample_every:
+            self.sampled_out += 1
+            return 0
+        return self.sample_every
+
+    @property
+    def persist_messages(self) -> bool:
+        return self.level < LoadLevel.MEMORY_ONLY
+
+    @property
+    def run_low_priority(self) -> bool:
+        return self.level < LoadLevel.ESSENTIAL
+
+    @property
+    def prioritise_channels(self) -> bool:
+        return self.level >= LoadLevel.PRIORITY
+
+    def summary(self) -> str:
+        return (
+            f"level={self.level.name} lag={self.lag * 1000:.0f}ms "
+            f"max_lag={self.max_lag * 1000:.0f}ms sampled_out={self.sampled_out} "
+            f"unpersisted={self.unpersisted}"
+        )
+
+
+load_monitor = LoadMonitor()
+
+
+@plugin.listen()
+async def on_started(_: hikari.StartedEvent) -> None:
+    load_monitor.start()
+
+
+@plugin.listen()
+async def on_stopping(_: hikari.StoppingEvent) -> None:
+    load_monitor.stop()
+
+
+@arc.loader
+def loader(client: arc.GatewayClient) -> None:
+    client.set_type_dependency(LoadMonitor, load_monitor)
+    client.add_plugin(plugin)
+
+
+@arc.unloader
+def unloader(client: arc.GatewayClient) -> None:
+    load_monitor.stop()
+    client.remove_plugin(plugin)
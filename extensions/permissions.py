@@ -0,0 +1,193 @@
+import logging
+import os
+import time
+from typing import Dict, Optional, Set, Tuple
+
+import arc
+import hikari
+import toolbox
+
+logger = logging.getLogger("permissions")
+
+plugin = arc.GatewayPlugin("permissions")
+
+SLOWMODE_PERMISSIONS = (
+    hikari.Permissions.VIEW_CHANNEL | hikari.Permissions.MANAGE_CHANNELS
+)
+NOTIFY_PERMISSIONS = hikari.Permissions.VIEW_CHANNEL | hikari.Permissions.SEND_MESSAGES
+
+
+class PermissionCache:
+    """Locally computed bot permissions per channel.
+
+    Permissions are evaluated from cached roles and overwrites, so lookups
+    return None whenever the cache can't answer and callers should fall back
+    to making the request.
+
+    Without the GUILD_MEMBERS intent the bot's own roles in the cache can go
+    stale, so a cached "no" is only trusted for `ttl`. After that one real
+    request is let through, and its outcome wins: `confirm_*` on success,
+    and `forget` on ForbiddenError.
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = ttl or float(os.environ.get("PERMISSION_CACHE_TTL", 300))
+        self.app: Optional[hikari.GatewayBot] = None
+
+        self._entries: Dict[int, Tuple[int, hikari.Permissions, float]] = {}
+        # Keyed by (channel_id, required permissions): when the cache started
+        # denying them, and which ones a real request succeeded with despite
+        # that. Confirmations last until the channel is forgotten.
+        self._denied_since: Dict[Tuple[int, hikari.Permissions], float] = {}
+        self._confirmed: Set[Tuple[int, hikari.Permissions]] = set()
+
+    def _calculate(self, channel_id: int) -> Optional[Tuple[int, hikari.Permissions]]:
+        if self.app is None:
+            return None
+
+        me = self.app.get_me()
+        channel = self.app.cache.get_guild_channel(channel_id)
+        if me is None or not isinstance(channel, hikari.PermissibleGuildChannel):
+            return None
+
+        member = self.app.cache.get_member(channel.guild_id, me.id)
+        if member is None:
+            return None
+
+        try:
+            permissions = toolbox.calculate_permissions(member, channel)
+        except (toolbox.CacheFailureError, KeyError):
+            return None
+
+        return channel.guild_id, permissions
+
+    def get(self, channel_id: int) -> Optional[hikari.Permissions]:
+        entry = self._entries.get(channel_id)
+        if entry is not None and time.monotonic() - entry[2] < self.ttl:
+            return entry[1]
+
+        result = self._calculate(channel_id)
+        if result is None:
+            self._entries.pop(channel_id, None)
+            return None
+
+        guild_id, permissions = result
+        self._entries[channel_id] = (guild_id, permissions, time.monotonic())
+        return permissions
+
+    def _has(self, channel_id: int, required: hikari.Permissions) -> Optional[bool]:
+        permissions = self.get(channel_id)
+        if permissions is None:
+            return None
+        if (permissions & required) == required:
+            return True
+
+        key = (channel_id, required)
+        if key in self._confirmed:
+            return True
+
+        now = time.monotonic()
+        denied_since = self._denied_since.setdefault(key, now)
+        if now - denied_since < self.ttl:
+            return False
+
+        # Let one request through to find out, then trust the cache again.
+        self._denied_since[key] = now
+        logger.debug("Re-checking cached denial for channel %s", channel_id)
+        return None
+
+    def can_manage(self, channel_id: int) -> Optional[bool]:
+        return self._has(channel_id, SLOWMODE_PERMISSIONS)
+
+    def can_notify(self, channel_id: int) -> Optional[bool]:
+        return self._has(channel_id, NOTIFY_PERMISSIONS)
+
+    def _confirm(self, channel_id: int, required: hikari.Permissions) -> None:
+        key = (channel_id, required)
+        if key in self._denied_since:
+            del self._denied_since[key]
+            self._confirmed.add(key)
+            logger.info(
+                f"Request in channel {channel_id} succeeded despite cached permissions, "
+                "trusting it"
+            )
+
+    def confirm_manage(self, channel_id: int) -> None:
+        """Record that a slowmode edit succeeded in the channel."""
+        self._confirm(channel_id, SLOWMODE_PERMISSIONS)
+
+    def confirm_notify(self, channel_id: int) -> None:
+        """Record that a notification was sent in the channel."""
+        self._confirm(channel_id, NOTIFY_PERMISSIONS)
+
+    def invalidate_channel(self, channel_id: int) -> None:
+        self._entries.pop(channel_id, None)
+
+    def invalidate_guild(self, guild_id: int) -> None:
+        for channel_id, entry in list(self._entries.items()):
+            if entry[0] == guild_id:
+                del self._entries[channel_id]
+
+    def forget(self, channel_id: int) -> None:
+        """Drop everything known about a channel, including real request outcomes.
+
+        Used when a request was refused, or the channel is no longer tracked.
+        """
+        self.invalidate_channel(channel_id)
+        for required in (SLOWMODE_PERMISSIONS, NOTIFY_PERMISSIONS):
+            self._denied_since.pop((channel_id, required), None)
+            self._confirmed.discard((channel_id, required))
+
+
+permission_cache = PermissionCache()
+
+
+@plugin.listen(hikari.RoleCreateEvent, hikari.RoleUpdateEvent, hikari.RoleDeleteEvent)
+async def on_role_change(
+    event: hikari.RoleCreateEvent | hikari.RoleUpdateEvent | hikari.RoleDeleteEvent,
+) -> None:
+    permission_cache.invalidate_guild(event.guild_id)
+
+
+@plugin.listen(hikari.GuildChannelUpdateEvent, hikari.GuildChannelDeleteEvent)
+async def on_channel_change(
+    event: hikari.GuildChannelUpdateEvent | hikari.GuildChannelDeleteEvent,
+) -> None:
+    permission_cache.invalidate_channel(event.channel_id)
+
+
+@plugin.listen(
+    hikari.GuildAvailableEvent, hikari.GuildUpdateEvent, hikari.GuildLeaveEvent
+)
+async def on_guild_change(
+    event: hikari.GuildAvailableEvent
+    | hikari.GuildUpdateEvent
+    | hikari.GuildLeaveEvent,
+) -> None:
+    permission_cache.invalidate_guild(event.guild_id)
+
+
+async def on_member_update(event: hikari.MemberUpdateEvent) -> None:
+    me = event.app.get_me()
+    if me is not None and event.user_id == me.id:
+        permission_cache.invalidate_guild(event.guild_id)
+
+
+@arc.loader
+def loader(client: arc.GatewayClient) -> None:
+    permission_cache.app = client.app
+    client.set_type_dependency(PermissionCache, permission_cache)
+    client.add_plugin(plugin)
+
+    # Member updates need the privileged GUILD_MEMBERS intent; without it the
+    # bot's cached roles aren't updated, and denials are instead re-checked
+    # with a real request once they are older than the TTL.
+    if client.app.intents & hikari.Intents.GUILD_MEMBERS:
+        client.subscribe(hikari.MemberUpdateEvent, on_member_update)
+
+
+@arc.unloader
+def unloader(client: arc.GatewayClient) -> None:
+    if client.app.intents & hikari.Intents.GUILD_MEMBERS:
+        client.unsubscribe(hikari.MemberUpdateEvent, on_member_update)
+    client.remove_plugin(plugin)
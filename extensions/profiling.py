@@ -0,0 +1,254 @@
+import asyncio
+import collections
+import contextlib
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Counter, Deque, Dict, Iterator, List, Optional, Tuple
+
+import arc
+
+logger = logging.getLogger("profiling")
+
+# Set only inside the update_slowmode task so other loops calling the same
+# helpers aren't attributed to the tick.
+_current_tick: contextvars.ContextVar[Optional["TickReport"]] = contextvars.ContextVar(
+    "current_tick", default=None
+)
+_current_guild: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar(
+    "current_guild", default=None
+)
+
+
+@dataclass
+class TickReport:
+    started_at: float
+    duration: float = 0.0
+    load_level: str = "NORMAL"
+    # Messages kept out of the in-memory windows since the previous tick.
+    late: int = 0
+    duplicates: int = 0
+    phases: Dict[str, float] = field(default_factory=dict)
+    guilds: Dict[int, float] = field(default_factory=dict)
+    channels: Dict[int, Dict[str, float]] = field(default_factory=dict)
+
+    def record(
+        self,
+        phase: str,
+        elapsed: float,
+        guild_id: Optional[int] = None,
+        channel_id: Optional[int] = None,
+    ) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + elapsed
+
+        if guild_id is not None:
+            self.guilds[guild_id] = self.guilds.get(guild_id, 0.0) + elapsed
+
+        if channel_id is not None:
+            channel_phases = self.channels.setdefault(channel_id, {})
+            channel_phases[phase] = channel_phases.get(phase, 0.0) + elapsed
+
+    def slowest_channels(self, limit: int = 5) -> List[Tuple[int, float]]:
+        totals = {
+            channel_id: sum(phases.values())
+            for channel_id, phases in self.channels.items()
+        }
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def slowest_guilds(self, limit: int = 5) -> List[Tuple[int, float]]:
+        return sorted(self.guilds.items(), key=lambda item: item[1], reverse=True)[
+            :limit
+        ]
+
+    def summary(self) -> str:
+        phases = " ".join(
+            f"{name}={elapsed:.3f}s"
+            for name, elapsed in sorted(
+                self.phases.items(), key=lambda item: item[1], reverse=True
+            )
+        )
+        return (
+            f"duration={self.duration:.3f}s load={self.load_level} "
+            f"late={self.late} duplicates={self.duplicates} "
+            f"channels={len(self.channels)} {phases}"
+        )
+
+
+class _Sampler(threading.Thread):
+    """Samples the event loop thread's stack at a fixed interval."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="tick-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.own: Counter[Tuple[str, int, str]] = collections.Counter()
+        self.cumulative: Counter[Tuple[str, str]] = collections.Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+
+            self.samples += 1
+            code = frame.f_code
+            self.own[(code.co_filename, frame.f_lineno, code.co_name)] += 1
+
+            seen = set()
+            while frame is not None:
+                key = (frame.f_code.co_filename, frame.f_code.co_name)
+                if key not in seen:
+                    seen.add(key)
+                    self.cumulative[key] += 1
+                frame = frame.f_back
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+class TickProfiler:
+    """Per-phase timings for update_slowmode ticks.
+
+    Keeps a bounded ring of recent tick reports and logs a structured report
+    for any tick that runs over the configured budget.
+    """
+
+    def __init__(self, history: Optional[int] = None, budget: Optional[float] = None):
+        self.budget = budget or float(os.environ.get("SLOW_TICK_BUDGET", 10))
+        self.ticks: Deque[TickReport] = collections.deque(
+            maxlen=history or int(os.environ.get("TICK_HISTORY", 20))
+        )
+
+        self._sampler: Optional[_Sampler] = None
+        self._sample_ticks = 0
+        self._sample_future: Optional[asyncio.Future[_Sampler]] = None
+
+    @contextlib.contextmanager
+    def tick(self) -> Iterator[TickReport]:
+        report = TickReport(started_at=time.time())
+        token = _current_tick.set(report)
+
+        if self._sample_future is not None and self._sampler is None:
+            self._sampler = _Sampler(threading.get_ident(), 0.005)
+            self._sampler.start()
+
+        try:
+            yield report
+        finally:
+            _current_tick.reset(token)
+            self._finish_tick(report)
+
+    @contextlib.contextmanager
+    def guild(self, guild_id: int) -> Iterator[None]:
+        token = _current_guild.set(guild_id)
+        try:
+            yield
+        finally:
+            _current_guild.reset(token)
+
+    def _finish_tick(self, report: TickReport) -> None:
+        report.duration = time.time() - report.started_at
+        self.ticks.append(report)
+
+        if report.duration > self.budget:
+            logger.warning(
+                "Slow tick: budget=%.2fs %s slowest_guilds=%s slowest_channels=%s",
+                self.budget,
+                report.summary(),
+                [(guild_id, round(t, 3)) for guild_id, t in report.slowest_guilds()],
+                [
+                    (channel_id, round(t, 3))
+                    for channel_id, t in report.slowest_channels()
+                ],
+            )
+
+        if self._sampler is not None:
+            self._sample_ticks -= 1
+            if self._sample_ticks <= 0:
+                self._finish_sampling()
+
+    @contextlib.contextmanager
+    def phase(self, name: str, channel_id: Optional[int] = None) -> Iterator[None]:
+        report = _current_tick.get()
+        if report is None:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            report.record(
+                name, time.perf_counter() - start, _current_guild.get(), channel_id
+            )
+
+    async def sample(self, ticks: int) -> Tuple[int, List[str]]:
+        """Run the sampling profiler for the next `ticks` ticks.
+
+        Returns the sample count and formatted hot spots.
+        """
+        if self._sample_future is not None:
+            raise RuntimeError("A profiling run is already in progress.")
+
+        self._sample_ticks = ticks
+        self._sample_future = asyncio.get_running_loop().create_future()
+        try:
+            sampler = await self._sample_future
+        finally:
+            self._sample_future = None
+
+        return sampler.samples, format_hot_spots(sampler)
+
+    def _finish_sampling(self) -> None:
+        sampler = self._sampler
+        self._sampler = None
+        if sampler is None:
+            return
+
+        sampler.stop()
+        if self._sample_future is not None and not self._sample_future.done():
+            self._sample_future.set_result(sampler)
+
+
+def format_hot_spots(sampler: _Sampler, limit: int = 10) -> List[str]:
+    if not sampler.samples:
+        return []
+
+    def short(filename: str) -> str:
+        return (
+            os.path.join(*filename.split(os.sep)[-2:])
+            if os.sep in filename
+            else filename
+        )
+
+    lines = ["Self:"]
+    for (filename, lineno, func), count in sampler.own.most_common(limit):
+        lines.append(
+            f"{count / sampler.samples:6.1%}  {short(filename)}:{lineno} {func}"
+        )
+
+    lines.append("Cumulative:")
+    for (filename, func), count in sampler.cumulative.most_common(limit):
+        lines.append(f"{count / sampler.samples:6.1%}  {short(filename)} {func}")
+
+    return lines
+
+
+tick_profiler = TickProfiler()
+
+
+@arc.loader
+def load(client: arc.GatewayClient) -> None:
+    client.set_type_dependency(TickProfiler, tick_profiler)
+
+
+@arc.unloader
+def unload(client: arc.GatewayClient) -> None:
+    tick_profiler._finish_sampling()
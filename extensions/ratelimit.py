@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+
+import arc
+import hikari
+
+from .db import Database
+
+logger = logging.getLogger("ratelimit")
+
+# Strong references to queued slowmode resets so they aren't garbage collected.
+reset_tasks: Set[asyncio.Task[None]] = set()
+
+
+@dataclass
+class DeferredEdit:
+    channel_id: int
+    current_slowmode: int
+    desired_slowmode: int
+    message_rate: float
+    threshold: int
+
+
+@dataclass
+class _Bucket:
+    capacity: int
+    period: float
+    tokens: float
+    updated_at: float
+
+    def refill(self, now: float) -> None:
+        if now <= self.updated_at:
+            return
+
+        rate = self.capacity / self.period
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * rate)
+        self.updated_at = now
+
+
+class EditBudget:
+    """Per-channel token buckets for slowmode edits.
+
+    Edits that don't fit in a channel's budget are deferred instead of being
+    queued on hikari's route bucket, and only the latest desired value for a
+    channel is kept.
+    """
+
+    def __init__(self, limit: Optional[int] = None, period: Optional[float] = None):
+        self.limit = limit or int(os.environ.get("EDIT_BUDGET_LIMIT", 4))
+        self.period = period or float(os.environ.get("EDIT_BUDGET_PERIOD", 120))
+
+        self._buckets: Dict[int, _Bucket] = {}
+        self._deferred: Dict[int, DeferredEdit] = {}
+
+    def _bucket(self, channel_id: int, now: float) -> _Bucket:
+        bucket = self._buckets.get(channel_id)
+        if bucket is None:
+            bucket = _Bucket(self.limit, self.period, float(self.limit), now)
+            self._buckets[channel_id] = bucket
+        else:
+            bucket.refill(now)
+        return bucket
+
+    def remaining(self, channel_id: int) -> int:
+        return int(self._bucket(channel_id, time.monotonic()).tokens)
+
+    def try_acquire(self, channel_id: int) -> bool:
+        bucket = self._bucket(channel_id, time.monotonic())
+        if bucket.tokens < 1:
+            return False
+
+        bucket.tokens -= 1
+        return True
+
+    def defer(
+        self,
+        channel_id: int,
+        current_slowmode: int,
+        desired_slowmode: int,
+        message_rate: float,
+        threshold: int,
+    ) -> None:
+        existing = self._deferred.get(channel_id)
+        if existing is not None:
+            # Keep the slowmode the channel actually has so notifications
+            # describe the real change, not an intermediate value.
+            current_slowmode = existing.current_slowmode
+
+        if current_slowmode == desired_slowmode:
+            self._deferred.pop(channel_id, None)
+            logger.debug(
+                "Dropped deferred edit for channel %s, desired value matches current",
+                channel_id,
+            )
+            return
+
+        self._deferred[channel_id] = DeferredEdit(
+            channel_id, current_slowmode, desired_slowmode, message_rate, threshold
+        )
+        logger.debug(
+            "Deferred slowmode edit for channel %s to %ss", channel_id, desired_slowmode
+        )
+
+    def pending(self, channel_id: int) -> Optional[DeferredEdit]:
+        return self._deferred.get(channel_id)
+
+    def discard(self, channel_id: int) -> None:
+        self._deferred.pop(channel_id, None)
+
+    def pop_ready(self) -> List[DeferredEdit]:
+        """Pop deferred edits whose channel has budget again, acquiring it."""
+        ready = []
+        for channel_id in list(self._deferred):
+            if self.try_acquire(channel_id):
+                ready.append(self._deferred.pop(channel_id))
+        return ready
+
+    def sync_from_rate_limit(
+        self, channel_id: int, error: hikari.RateLimitTooLongError
+    ) -> None:
+        """Align a channel's bucket with the limits Discord reported."""
+        now = time.monotonic()
+        bucket = self._bucket(channel_id, now)
+
+        if error.limit:
+            bucket.capacity = error.limit
+        if error.period:
+            bucket.period = error.period
+
+        # The bucket is exhausted until Discord resets it; backdate the refill
+        # clock so the first token becomes available at reset_at.
+        wait = max(0.0, error.reset_at - time.time())
+        bucket.tokens = 0.0
+        bucket.updated_at = now + wait - bucket.period / bucket.capacity
+
+    def forget(self, channel_id: int) -> None:
+        self._buckets.pop(channel_id, None)
+        self._deferred.pop(channel_id, None)
+
+
+async def _reset_later(
+    rest: hikari.api.RESTClient, database: Database, channel_id: int, delay: float
+) -> None:
+    while True:
+        await asyncio.sleep(delay)
+
+        # Re-enabled in the meantime; the control loop owns the slowmode again.
+        if await database.get_enabled_channel_ids([channel_id]):
+            logger.debug(
+                "Dropped queued slowmode reset for re-enabled channel %s", channel_id
+            )
+            return
+
+        try:
+            await rest.edit_channel(channel_id, rate_limit_per_user=0)
+        except hikari.RateLimitTooLongError as e:
+            delay = e.retry_after
+            continue
+        except Exception as e:
+            logger.error(f"Error resetting slowmode for channel {channel_id}: {str(e)}")
+            return
+
+        logger.info(f"Reset slowmode for channel {channel_id} after rate limit")
+        return
+
+
+async def reset_slowmode(
+    rest: hikari.api.RESTClient, database: Database, channel_id: int
+) -> Optional[float]:
+    """Turn off a channel's slowmode once auto-slowmode no longer manages it.
+
+    MAX_RATE_LIMIT makes hikari raise on long route buckets instead of
+    waiting, but this edit must not be lost: nothing would lower the
+    slowmode afterwards. If the route is limited, the reset is queued and
+    the seconds until it is retried are returned; otherwise None.
+    """
+    try:
+        await rest.edit_channel(channel_id, rate_limit_per_user=0)
+    except hikari.RateLimitTooLongError as e:
+        task = asyncio.create_task(
+            _reset_later(rest, database, channel_id, e.retry_after)
+        )
+        reset_tasks.add(task)
+        task.add_done_callback(reset_tasks.discard)
+        logger.info(
+            f"Queued slowmode reset for channel {channel_id} in {e.retry_after:.0f}s"
+        )
+        return e.retry_after
+    return None
+
+
+edit_budget = EditBudget()
+
+
+@arc.loader
+def load(client: arc.GatewayClient) -> None:
+    client.set_type_dependency(EditBudget, edit_budget)
+
+
+@arc.unloader
+def unload(client: arc.GatewayClient) -> None:
+    pass
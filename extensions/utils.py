@@ -1,15 +1,75 @@
+import bisect
+import collections
+import csv
+import datetime
+import json
 import logging
+import os
 import traceback
-from typing import Dict, List
+from typing import Deque, Dict, Iterable, List, Optional, Sequence, TextIO, Tuple
 
 import arc
 import hikari
 
+from .db import Database
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 logger = logging.getLogger("utils")
 
 plugin = arc.GatewayPlugin("utils")
 
-message_cache: Dict[int, List[float]] = {}
+
+class RateWindow:
+    """Weighted message counts in one-second buckets, keyed by event time.
+
+    Memory is bounded by the window length rather than the message count,
+    and sampled messages can be recorded with a weight. Buckets stay
+    ordered when a message arrives after newer ones.
+    """
+
+    __slots__ = ("buckets",)
+
+    def __init__(self) -> None:
+        self.buckets: Deque[List[int]] = collections.deque()
+
+    def add(self, timestamp: float, weight: int = 1) -> None:
+        second = int(timestamp)
+        buckets = self.buckets
+
+        if not buckets or buckets[-1][0] < second:
+            buckets.append([second, weight])
+            return
+
+        # Out-of-order messages are bounded by the watermark lateness, so
+        # this only walks back a few buckets.
+        for index in range(len(buckets) - 1, -1, -1):
+            if buckets[index][0] == second:
+                buckets[index][1] += weight
+                return
+            if buckets[index][0] < second:
+                buckets.insert(index + 1, [second, weight])
+                return
+        buckets.appendleft([second, weight])
+
+    def count(self, window_seconds: int, now: float) -> int:
+        cutoff = int(now - window_seconds)
+        while self.buckets and self.buckets[0][0] <= cutoff:
+            self.buckets.popleft()
+        return sum(count for _, count in self.buckets)
+
+
+message_cache: Dict[int, RateWindow] = {}
+
+
+def record_message_rate(channel_id: int, timestamp: float, weight: int = 1) -> None:
+    window = message_cache.get(channel_id)
+    if window is None:
+        window = message_cache[channel_id] = RateWindow()
+    window.add(timestamp, weight)
 
 
 def calculate_message_rate(channel_id: int, window_seconds: int = 60) -> float:
@@ -18,35 +78,168 @@ def calculate_message_rate(channel_id: int, window_seconds: int = 60) -> float:
     if channel_id not in message_cache:
         return 0.0
 
-    now = time.time()
-    cutoff = now - window_seconds
+    count = message_cache[channel_id].count(window_seconds, time.time())
+
+    return count * (60 / window_seconds)
+
+
+def calculate_message_rates(
+    channel_ids: Sequence[int], window_seconds: int = 60
+) -> List[float]:
+    """Rates for many channels, reading the clock and scale once per batch."""
+    import time
+
+    cutoff = int(time.time() - window_seconds)
+    scale = 60 / window_seconds
+    get_window = message_cache.get
+
+    rates = []
+    for channel_id in channel_ids:
+        window = get_window(channel_id)
+        if window is None:
+            rates.append(0.0)
+            continue
+
+        buckets = window.buckets
+        while buckets and buckets[0][0] <= cutoff:
+            buckets.popleft()
+        rates.append(sum(count for _, count in buckets) * scale)
+    return rates
+
+
+class SlowmodeLadder:
+    """Slowmode levels keyed by how far a channel's rate exceeds its threshold.
+
+    Each step is `(multiplier, seconds)`: a rate above `threshold * multiplier`
+    gets at least `seconds` of slowmode. Rates at or below the first
+    multiplier get no slowmode.
+    """
+
+    def __init__(self, steps: Sequence[Tuple[float, int]]):
+        steps = sorted(steps)
+        self.breakpoints = [float(multiplier) for multiplier, _ in steps]
+        self.levels = [0] + [int(seconds) for _, seconds in steps]
 
-    message_cache[channel_id] = [ts for ts in message_cache[channel_id] if ts > cutoff]
+        if np is not None:
+            self._np_breakpoints = np.asarray(self.breakpoints, dtype=np.float64)
+            self._np_levels = np.asarray(self.levels, dtype=np.int64)
 
-    return len(message_cache[channel_id]) * (60 / window_seconds)
+    @classmethod
+    def from_string(cls, value: str) -> "SlowmodeLadder":
+        """Parse a ladder like `1:5,1.5:10,2:15`."""
+        steps = []
+        for step in value.split(","):
+            multiplier, seconds = step.split(":")
+            steps.append((float(multiplier), int(seconds)))
+        return cls(steps)
 
 
-async def determine_optimal_slowmode(message_rate: float, threshold: int) -> int:
-    if message_rate <= threshold:
+DEFAULT_SLOWMODE_LADDER = "1:5,1.5:10,2:15,3:30,4:60,5:120,6:300,7:600,8:900"
+
+slowmode_ladder = SlowmodeLadder.from_string(
+    os.environ.get("SLOWMODE_LADDER", DEFAULT_SLOWMODE_LADDER)
+)
+
+
+def _rate_ratio(message_rate: float, threshold: float) -> float:
+    if threshold > 0:
+        return message_rate / threshold
+    return float("inf") if message_rate > 0 else 0.0
+
+
+def evaluate_slowmode_levels(
+    message_rates: Sequence[float],
+    thresholds: Sequence[float],
+    ladder: Optional[SlowmodeLadder] = None,
+) -> List[int]:
+    """Return the target slowmode for every channel in one pass."""
+    ladder = ladder or slowmode_ladder
+
+    if np is not None:
+        rates = np.asarray(message_rates, dtype=np.float64)
+        limits = np.asarray(thresholds, dtype=np.float64)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratios = np.where(
+                limits > 0,
+                rates / np.where(limits > 0, limits, 1.0),
+                np.where(rates > 0, np.inf, 0.0),
+            )
+
+        indexes = np.searchsorted(ladder._np_breakpoints, ratios, side="left")
+        return ladder._np_levels[indexes].tolist()
+
+    return [
+        ladder.levels[
+            bisect.bisect_left(ladder.breakpoints, _rate_ratio(rate, threshold))
+        ]
+        for rate, threshold in zip(message_rates, thresholds)
+    ]
+
+
+def get_slowmode_seconds(channel: hikari.PartialChannel) -> int:
+    rate_limit = getattr(channel, "rate_limit_per_user", None)
+    if rate_limit is None:
         return 0
-    elif message_rate <= threshold * 1.5:
-        return 5
-    elif message_rate <= threshold * 2:
-        return 10
-    elif message_rate <= threshold * 3:
-        return 15
-    elif message_rate <= threshold * 4:
-        return 30
-    elif message_rate <= threshold * 5:
-        return 60
-    elif message_rate <= threshold * 6:
-        return 120
-    elif message_rate <= threshold * 7:
-        return 300
-    elif message_rate <= threshold * 8:
-        return 600
-    else:
-        return 900
+    if isinstance(rate_limit, datetime.timedelta):
+        return int(rate_limit.total_seconds())
+    return int(rate_limit)
+
+
+EXPORT_FORMATS = ("csv", "ndjson")
+
+
+class ActivityExportWriter:
+    """Writes `(channel_id, timestamp, message_count)` rows to a text stream."""
+
+    fields = ("channel_id", "timestamp", "message_count")
+
+    def __init__(self, stream: TextIO, export_format: str = "csv"):
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {export_format}")
+
+        self.stream = stream
+        self.export_format = export_format
+        self.rows = 0
+
+        if export_format == "csv":
+            self._csv = csv.writer(stream)
+            self._csv.writerow(self.fields)
+
+    def write_rows(self, rows: Iterable[Tuple[int, int, int]]) -> None:
+        if self.export_format == "csv":
+            for row in rows:
+                self._csv.writerow(row)
+                self.rows += 1
+        else:
+            for row in rows:
+                self.stream.write(json.dumps(dict(zip(self.fields, row))) + "\n")
+                self.rows += 1
+
+
+async def export_activity(
+    database: Database,
+    stream: TextIO,
+    export_format: str = "csv",
+    channel_id: Optional[int] = None,
+    guild_id: Optional[int] = None,
+    since: int = 0,
+    batch_size: int = 1000,
+) -> int:
+    """Stream activity rows from the database into `stream`, returning the row count."""
+    writer = ActivityExportWriter(stream, export_format)
+    batch = []
+
+    async for row in database.iter_activity(
+        channel_id=channel_id, guild_id=guild_id, since=since, batch_size=batch_size
+    ):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            writer.write_rows(batch)
+            batch.clear()
+
+    writer.write_rows(batch)
+    return writer.rows
 
 
 @plugin.set_error_handler